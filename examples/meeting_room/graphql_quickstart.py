@@ -23,9 +23,9 @@ def test_run(users):
         mutation=op_schema(op_type='Mutation', schema_all=schema_all)
     )
 
-    from stargql import GraphQL
+    from onto.sink.graphql import graphql_app
 
-    app = GraphQL(
+    app = graphql_app(
         schema=schema,
     )
 
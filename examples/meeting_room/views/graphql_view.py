@@ -28,9 +28,8 @@ class UserGraphQLMediator(Mediator):
 
     @src.triggers.on_create
     async def user_added(self, obj):
-        q = self.subscribe_user_view.qs[obj.doc_id]
         d = obj.to_dict()
-        await q.put(d)
+        self.subscribe_user_view.publish(obj.doc_id, d, key=obj.doc_id)
         # import asyncio
         # # tell asyncio to enqueue the result
         # fut = asyncio.run_coroutine_threadsafe(
@@ -53,8 +53,10 @@ class MeetingSessionGet(Mediator):
         assert isinstance(meeting, Meeting)
 
         def notify(obj):
-            for ref in obj._view_refs:
-                self.sink.emit(reference=ref, snapshot=obj.to_snapshot())
+            # Writes every view of the session in one batch
+            snapshot = obj.to_snapshot()
+            self.sink.emit_many(
+                [(ref, snapshot) for ref in obj._view_refs])
 
         _ = MeetingSession.get(
             doc_id=meeting.doc_id,
@@ -0,0 +1,187 @@
+"""
+Codecs encode a document (dict) to bytes for a message payload and
+    decode it back. The id of the codec is sent in the message header
+    CODEC_HEADER, so that a consumer decodes messages of a topic written
+    with different codecs.
+
+Example:
+    KafkaDatabase.codec = 'msgpack'
+    register_codec(SchemaCodec.from_model(Meeting))
+"""
+
+import threading
+
+CODEC_HEADER = 'onto-codec'
+
+
+class Codec:
+    """ Encodes documents for message payloads
+    """
+
+    codec_id = None
+
+    def encode(self, d: dict) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, b: bytes) -> dict:
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    """ Encodes with the stdlib json module
+    """
+
+    codec_id = 'json'
+
+    def encode(self, d):
+        import json
+        return json.dumps(d).encode(encoding='utf-8')
+
+    def decode(self, b):
+        import json
+        return json.loads(b)
+
+
+class OrjsonCodec(Codec):
+    """ Encodes with orjson (optional dependency)
+    """
+
+    codec_id = 'orjson'
+
+    def encode(self, d):
+        import orjson
+        return orjson.dumps(d)
+
+    def decode(self, b):
+        import orjson
+        return orjson.loads(b)
+
+
+class MsgpackCodec(Codec):
+    """ Encodes with msgpack (optional dependency)
+    """
+
+    codec_id = 'msgpack'
+
+    def encode(self, d):
+        import msgpack
+        return msgpack.packb(d, use_bin_type=True)
+
+    def decode(self, b):
+        import msgpack
+        return msgpack.unpackb(b, raw=False)
+
+
+class SchemaCodec(MsgpackCodec):
+    """ Encodes the fields of a marshmallow schema by position instead of
+            by name: a document is packed as
+            [bitmap of present fields, *values of present fields, extras],
+            where extras holds keys that are not in the schema.
+            Producer and consumer must register a codec of the same schema.
+
+    codec_id ends with a fingerprint of the keys, so that a message
+        written with another version of the schema names a codec that is
+        not registered instead of being decoded into the wrong fields.
+    """
+
+    def __init__(self, keys, name):
+        """
+
+        :param keys: data keys of the schema, in order
+        :param name: part of codec_id
+        """
+        self.keys = tuple(keys)
+        self._positions = {key: i for i, key in enumerate(self.keys)}
+        self.codec_id = f'schema:{name}:{self.fingerprint(self.keys)}'
+
+    @staticmethod
+    def fingerprint(keys) -> str:
+        import hashlib
+        b = '\0'.join(keys).encode(encoding='utf-8')
+        return hashlib.sha256(b).hexdigest()[:8]
+
+    @classmethod
+    def from_schema(cls, schema_obj, name=None):
+        keys = [
+            field.data_key if field.data_key is not None else key
+            for key, field in schema_obj.fields.items()
+            if not field.load_only
+        ]
+        if name is None:
+            name = schema_obj.__class__.__name__
+        return cls(keys=keys, name=name)
+
+    @classmethod
+    def from_model(cls, obj_cls):
+        """ Returns the codec of the generated schema of obj_cls
+        """
+        return cls.from_schema(
+            obj_cls.get_schema_obj(), name=obj_cls.__name__)
+
+    def encode(self, d):
+        import msgpack
+        bitmap = 0
+        values = [None] * len(self.keys)
+        extras = dict()
+        for key, val in d.items():
+            i = self._positions.get(key, None)
+            if i is None:
+                extras[key] = val
+            else:
+                bitmap |= 1 << i
+                values[i] = val
+        packed = [bitmap]
+        packed.extend(
+            val for i, val in enumerate(values) if bitmap >> i & 1)
+        packed.append(extras)
+        return msgpack.packb(packed, use_bin_type=True)
+
+    def decode(self, b):
+        import msgpack
+        packed = msgpack.unpackb(b, raw=False)
+        bitmap, extras = packed[0], packed[-1]
+        values = iter(packed[1:-1])
+        d = {key: next(values)
+             for i, key in enumerate(self.keys) if bitmap >> i & 1}
+        d.update(extras)
+        return d
+
+
+_codecs = dict()
+_lock = threading.Lock()
+
+
+def register_codec(codec: Codec) -> Codec:
+    with _lock:
+        _codecs[codec.codec_id] = codec
+    return codec
+
+
+def get_codec(codec) -> Codec:
+    """ Returns the registered codec
+
+    :param codec: codec id, or a Codec (returned as is)
+    """
+    if isinstance(codec, Codec):
+        return codec
+    try:
+        return _codecs[codec]
+    except KeyError as e:
+        raise ValueError(f'Unknown codec: {codec}') from e
+
+
+def codec_of(headers, default=None) -> Codec:
+    """ Returns the codec named in message headers
+
+    :param headers: sequence of (key, value) of a message
+    :param default: codec (or codec id) for messages without CODEC_HEADER;
+        defaults to json
+    """
+    for key, val in headers or ():
+        if key == CODEC_HEADER:
+            return get_codec(val.decode(encoding='utf-8'))
+    return get_codec(default if default is not None else JsonCodec.codec_id)
+
+
+for _codec in (JsonCodec(), OrjsonCodec(), MsgpackCodec()):
+    register_codec(_codec)
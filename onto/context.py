@@ -27,6 +27,9 @@ from onto.database import Database, Listener
 _transaction_var: ContextVar['firestore.Transaction'] = \
     ContextVar('_transaction_var', default=None)
 
+_gallery_var: ContextVar['Gallery'] = \
+    ContextVar('_gallery_var', default=None)
+
 
 class Context:
     """ Context Singleton for Firestore, Firebase and Celery app.
@@ -54,6 +57,12 @@ class Context:
 
     transaction_var = _transaction_var
 
+    # Gallery shared by objects imported in the current request
+    #   (see Gallery.activate)
+    gallery_var = _gallery_var
+
+    _kafka_producer_pool = None
+
     # Deleted on purpose to ensure that .<flag> is not evaluated as False
     #   when .<flag> is neither set to True, nor set to False.
     # debug = None
@@ -186,6 +195,26 @@ class Context:
                         f"loading config: {vars(config)}")
         cls._ready = True
 
+    @classmethod
+    def kafka_producer_pool(cls) -> 'KafkaProducerPool':
+        """ Returns the process-wide pool of async Kafka producers, which
+                is created on first use with the producer config of the
+                kafka database, and closed when the interpreter exits.
+        """
+        if cls._kafka_producer_pool is None:
+            from onto.database.kafka import KafkaDatabase, KafkaProducerPool
+            cls._kafka_producer_pool = KafkaProducerPool(
+                **KafkaDatabase.producer_config)
+            import atexit
+            atexit.register(cls.close_kafka_producer_pool)
+        return cls._kafka_producer_pool
+
+    @classmethod
+    def close_kafka_producer_pool(cls):
+        pool, cls._kafka_producer_pool = cls._kafka_producer_pool, None
+        if pool is not None:
+            pool.close()
+
     @classmethod
     def _reload_services(cls, services: dict):
         class Services:
@@ -303,6 +332,15 @@ class Context:
                 bootstrap_servers = db_config['bootstrap_servers']
                 from onto.database.kafka import KafkaDatabase
                 KafkaDatabase.bootstrap_servers = bootstrap_servers
+                KafkaDatabase.producer_config = {
+                    key: db_config[key]
+                    for key in KafkaDatabase.PRODUCER_CONFIG_KEYS
+                    if key in db_config
+                }
+                KafkaDatabase.codec = db_config.get('codec', 'json')
+                KafkaDatabase.close_producer()
+                # Recreated with the new config on next use
+                Context.close_kafka_producer_pool()
                 return KafkaDatabase
             except ImportError as e:
                 raise TypeError('kafka is configured, but '
@@ -1,45 +1,258 @@
 import functools
-from queue import Queue
-from threading import Thread
+import inspect
+import itertools
+from queue import Queue, Full, Empty
+from threading import Thread, Event, Lock, get_ident
+
+
+class _Pending:
+    """ Placeholder in a task queue for the latest task added with key
+            (see Coordinator.COALESCE)
+    """
+
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
 
 
 class Coordinator:
-    """ Manages a task queue.
-    Listener adds function invocations to the task queue.
+    """ Manages task queues.
+    Listener adds function invocations to the task queues.
+
+    Tasks are partitioned by key (for example, a document reference or
+        a source): tasks with the same key run in the order they are
+        added, and tasks with different keys may run concurrently on
+        up to n_workers workers. Tasks added without a key are
+        distributed round-robin.
+
+    Example:
+        Listener._coordinator = Coordinator(
+            n_workers=8, maxsize=100, overflow=Coordinator.COALESCE)
+
     """
 
-    def __init__(self, *args, **kwargs):
+    THREAD = 'thread'
+    ASYNCIO = 'asyncio'
+
+    BLOCK = 'block'
+    DROP_OLDEST = 'drop_oldest'
+    COALESCE = 'coalesce'
+
+    def __init__(self, *args, n_workers=1, executor=THREAD,
+                 maxsize=0, overflow=BLOCK, **kwargs):
+        """
+
+        :param n_workers: number of partitions that run concurrently
+        :param executor: one of:
+            'thread': each partition runs on its own thread;
+            'asyncio': partitions are consumed on one event loop that runs
+                on a thread; coroutine functions run on the loop, and
+                other tasks run on a pool of n_workers threads so that
+                partitions do not wait for each other. A task may return
+                an awaitable, which is awaited before the next task of
+                the same partition
+        :param maxsize: maximum number of pending tasks in each partition;
+            0 for unbounded
+        :param overflow: one of:
+            'block': adding a task to a full partition blocks;
+            'drop_oldest': adding a task to a full partition drops the
+                oldest pending task of the partition;
+            'coalesce': adding a task with the key of a pending task
+                replaces the pending task, so that only the newest task
+                for a key runs (tasks must not depend on being invoked
+                once per add); otherwise blocks when full
+        """
         super().__init__(*args, **kwargs)
-        self.q = Queue()
-        self._start_thread()
+        if executor not in (self.THREAD, self.ASYNCIO):
+            raise ValueError(f'Unknown executor: {executor}')
+        if overflow not in (self.BLOCK, self.DROP_OLDEST, self.COALESCE):
+            raise ValueError(f'Unknown overflow policy: {overflow}')
+        self.n_workers = n_workers
+        self.executor = executor
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self._round_robin = itertools.count()
+        self._lock = Lock()
+        self._pending = dict()
+        self.n_coalesced = 0
+        self.n_dropped = 0
+        if executor == self.ASYNCIO:
+            self._start_loop()
+        else:
+            self.qs = [Queue(maxsize=maxsize) for _ in range(n_workers)]
+            self._start_threads()
+
+    @property
+    def depth(self) -> int:
+        """ Number of pending tasks in all partitions
+        """
+        return sum(q.qsize() for q in self.qs)
+
+    def _take(self, item):
+        """ Resolves a placeholder to the newest task added with its key
+        """
+        if isinstance(item, _Pending):
+            with self._lock:
+                return self._pending.pop(item.key)
+        return item
+
+    @property
+    def q(self):
+        """ Queue of the first partition
+        """
+        return self.qs[0]
 
     # def start(self):
     #     self._start_thread()
 
-    def _main(self):
-        """ Push None to self.q to stop the thread
+    def _main(self, q):
+        """ Push None to q to stop the thread
 
         :return:
         """
         while True:
-            item = self.q.get()
+            item = q.get()
             if item is None:
                 break
             try:
+                item = self._take(item)
                 item()
             except Exception as e:
                 from onto.context import Context as CTX
                 CTX.logger.exception(f"a task in the queue has failed {item}")
-            self.q.task_done()
+            q.task_done()
+
+    async def _amain(self, q):
+        """ Push None to q to stop the consumer
+
+        :return:
+        """
+        while True:
+            item = await q.get()
+            if item is None:
+                break
+            try:
+                item = self._take(item)
+                if inspect.iscoroutinefunction(item):
+                    res = item()
+                else:
+                    res = await self.loop.run_in_executor(self._pool, item)
+                if inspect.isawaitable(res):
+                    await res
+            except Exception as e:
+                from onto.context import Context as CTX
+                CTX.logger.exception(f"a task in the queue has failed {item}")
+            q.task_done()
+
+    def _start_threads(self):
+        self.threads = [
+            Thread(target=self._main, args=(q,), daemon=True)
+            for q in self.qs
+        ]
+        for thread in self.threads:
+            thread.start()
+        self.thread = self.threads[0]
+
+    def _start_loop(self):
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        self.loop = asyncio.new_event_loop()
+        self._pool = ThreadPoolExecutor(max_workers=self.n_workers)
+        ready = Event()
 
-    def _start_thread(self):
-        self.thread = Thread(target=self._main, daemon=True)
+        def main():
+            asyncio.set_event_loop(self.loop)
+            self.qs = [asyncio.Queue(maxsize=self.maxsize)
+                       for _ in range(self.n_workers)]
+            for q in self.qs:
+                self.loop.create_task(self._amain(q))
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = Thread(target=main, daemon=True)
+        self.threads = [self.thread]
         self.thread.start()
+        ready.wait()
+
+    def _partition(self, key):
+        if key is None:
+            return next(self._round_robin) % self.n_workers
+        else:
+            return hash(key) % self.n_workers
 
-    def _add_awaitable(self, item):
-        """ TODO: test
+    def _add_awaitable(self, item, key=None):
+        """ Adds a task
 
-        :param item:
+        :param item: callable with no arguments
+        :param key: tasks with the same key run in order
         :return:
         """
-        self.q.put(item)
+        q = self.qs[self._partition(key)]
+        if self.overflow == self.COALESCE and key is not None:
+            with self._lock:
+                if key in self._pending:
+                    self._pending[key] = item
+                    self.n_coalesced += 1
+                    return
+                self._pending[key] = item
+            item = _Pending(key)
+
+        if self.executor == self.ASYNCIO:
+            self._put_async(q, item)
+        else:
+            self._put(q, item)
+
+    def _drop(self, item):
+        with self._lock:
+            self.n_dropped += 1
+            if isinstance(item, _Pending):
+                self._pending.pop(item.key, None)
+
+    def _put(self, q: Queue, item):
+        if self.overflow != self.DROP_OLDEST:
+            q.put(item)
+            return
+        while True:
+            try:
+                q.put_nowait(item)
+                return
+            except Full:
+                try:
+                    self._drop(q.get_nowait())
+                    q.task_done()
+                except Empty:
+                    pass
+
+    def _put_async(self, q, item):
+        import asyncio
+
+        def put_nowait():
+            if self.overflow == self.DROP_OLDEST:
+                while q.full():
+                    self._drop(q.get_nowait())
+                    q.task_done()
+            q.put_nowait(item)
+
+        if self.overflow == self.DROP_OLDEST or self.maxsize == 0:
+            self.loop.call_soon_threadsafe(put_nowait)
+        elif get_ident() == self.thread.ident:
+            # Blocking on the loop thread would never return
+            self.loop.create_task(q.put(item))
+        else:
+            asyncio.run_coroutine_threadsafe(q.put(item), self.loop).result()
+
+    def join(self):
+        """ Blocks until all tasks added so far are done
+        """
+        if self.executor == self.ASYNCIO:
+            import asyncio
+
+            async def _join():
+                for q in self.qs:
+                    await q.join()
+
+            asyncio.run_coroutine_threadsafe(_join(), self.loop).result()
+        else:
+            for q in self.qs:
+                q.join()
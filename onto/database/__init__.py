@@ -1,5 +1,8 @@
 import collections
+import collections.abc
 import abc
+import types
+import weakref
 
 from onto.common import _NA
 
@@ -14,9 +17,21 @@ class ConditionArg(Enum):
     pass
 
 
-class Reference(collections.UserString):
+class Reference:
     """
     example: '/myusername/'
+
+    A reference is immutable: the path is split into segments once and
+        the hash is computed once. Compares and hashes equal to its
+        string form, so that it may be used interchangeably with str
+        as a dict key.
+    """
+
+    __slots__ = ('_s', '_path', '_hash', '_is_empty', '__weakref__')
+
+    _intern_table = weakref.WeakValueDictionary()
+    """
+    (cls, str) -> Reference; see Reference.from_str(..., intern=True) 
     """
 
     def __init__(self, _s='', *, _is_empty=True):
@@ -32,29 +47,64 @@ class Reference(collections.UserString):
                 f'as the value for _is_empty. '
                 'Initialize with Reference.from_str where applicable. '
             )
+        _s = str(_s)
         self._is_empty = _is_empty
-        super().__init__(_s)
+        self._s = _s
+        self._path = tuple(_s.split('/'))
+        self._hash = hash(_s)
+
+    @classmethod
+    def _from_path(cls, s: str, path: tuple, _is_empty=False):
+        """ Initializes without splitting s again
+        """
+        obj = cls.__new__(cls)
+        obj._is_empty = _is_empty
+        obj._s = s
+        obj._path = path
+        obj._hash = hash(s)
+        return obj
 
     def child(self, s):
+        s = str(s)
         if self._is_empty:
-            return self.__class__(_s=s, _is_empty=False)
+            return self._from_path(s, tuple(s.split('/')))
         else:
-            return self.__class__(_s=f'{self}/{s}', _is_empty=False)
+            return self._from_path(
+                f'{self._s}/{s}', self._path + tuple(s.split('/')))
 
     @classmethod
-    def from_str(cls, s: str):
+    def from_str(cls, s: str, *, intern=False):
+        """ Deserializes a reference from str
+
+        :param s:
+        :param intern: if set to True, returns the same object for
+            identical strings while the object is alive (for example,
+            to share references of documents from the watch stream)
+        :return:
+        """
+        if intern:
+            key = (cls, s)
+            obj = cls._intern_table.get(key, None)
+            if obj is None:
+                obj = cls.from_str(s)
+                cls._intern_table[key] = obj
+            return obj
         if s == '':
             return cls(_is_empty=True, _s=s)
         else:
             return cls(_is_empty=False, _s=s)
 
+    @property
+    def data(self) -> str:
+        return self._s
+
     @property
     def first(self):
-        return self.data.split('/')[0]  # example: '/myusername/'
+        return self._path[0]  # example: '/myusername/'
 
     @property
     def last(self):
-        return self.data.split('/')[-1]
+        return self._path[-1]
 
     @property
     def id(self):
@@ -62,7 +112,7 @@ class Reference(collections.UserString):
 
     @property
     def params(self):
-        return self.data.split('/')
+        return list(self._path)
 
     @property
     def to_str(self):
@@ -70,7 +120,7 @@ class Reference(collections.UserString):
 
     @property
     def path(self) -> tuple:
-        return tuple(self.params)
+        return self._path
 
     @property
     def collection(self):
@@ -88,14 +138,70 @@ class Reference(collections.UserString):
     def __rtruediv__(self, other):
         raise TypeError('str / Reference is not supported')
 
+    def __str__(self):
+        return self._s
+
+    def __repr__(self):
+        return repr(self._s)
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if isinstance(other, Reference):
+            return self._s == other._s
+        return self._s == other
+
+    def __lt__(self, other):
+        return self._s < str(other)
+
+    def __le__(self, other):
+        return self._s <= str(other)
+
+    def __gt__(self, other):
+        return self._s > str(other)
+
+    def __ge__(self, other):
+        return self._s >= str(other)
+
+    def __len__(self):
+        return len(self._s)
+
+    def __contains__(self, item):
+        return str(item) in self._s
+
+    def __getitem__(self, item):
+        return self._s[item]
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return self._from_path, (self._s, self._path, self._is_empty)
+
 
 reference = Reference()
 
 
-class Snapshot(collections.UserDict):
+class Snapshot(collections.abc.Mapping):
+    """
+    Read-only mapping of document data, with metadata such as
+        exists and update_time kept in slots beside the data.
+
+    The snapshot takes ownership of a dict passed as the only positional
+        argument (no copy is made); do not mutate that dict afterwards.
+        Use Snapshot.view for read-only access without copying, and
+        Snapshot.to_dict for a copy that the caller may mutate.
+    """
+
+    __slots__ = ('_data', '_meta', 'exists', 'create_time', 'update_time',
+                 'read_time', '_onto_prev', '_onto_next')
 
-    next = property()
-    prev = property()
+    _META_FIELDS = frozenset(
+        ('exists', 'create_time', 'update_time', 'read_time', 'prev', 'next'))
 
     def __init__(self, *args, __onto_meta__=None, **kwargs):
         """
@@ -104,15 +210,43 @@ class Snapshot(collections.UserDict):
         TODO:   '__onto_meta__' and thus cause error
 
         :param args:
-        :param __onto_meta__:
+        :param __onto_meta__: metadata, for example: exists, create_time,
+            update_time, read_time. Other keys are kept in a dict and
+            are available as attributes.
         :param kwargs:
         """
-        super().__init__(*args, **kwargs)
+        if len(args) == 1 and args[0] is None:
+            # Same as UserDict(None); to_dict() of a missing document
+            #   returns None
+            args = ()
+        if len(args) == 1 and len(kwargs) == 0 and type(args[0]) is dict:
+            self._data = args[0]
+        else:
+            self._data = dict(*args, **kwargs)
+        self._meta = None
+        self.exists = None
+        self.create_time = None
+        self.update_time = None
+        self.read_time = None
+        self._onto_prev = None
+        self._onto_next = None
         if __onto_meta__ is not None:
             for key, val in __onto_meta__.items():
-                setattr(self, key, val)
+                if key in self._META_FIELDS:
+                    setattr(self, key, val)
+                else:
+                    if self._meta is None:
+                        self._meta = dict()
+                    self._meta[key] = val
+
+    def __getattr__(self, key):
+        # Only called when key is not a slot
+        meta = object.__getattribute__(self, '_meta')
+        if meta is not None and key in meta:
+            return meta[key]
+        raise AttributeError(key)
 
-    @next.getter
+    @property
     def next(self):
         return self._onto_next
 
@@ -120,7 +254,7 @@ class Snapshot(collections.UserDict):
     def next(self, _onto_next):
         self._onto_next = _onto_next
 
-    @prev.getter
+    @property
     def prev(self):
         return self._onto_prev
 
@@ -128,8 +262,68 @@ class Snapshot(collections.UserDict):
     def prev(self, _onto_prev):
         self._onto_prev = _onto_prev
 
+    @property
+    def data(self):
+        """ Read-only view of the data (for compatibility with UserDict)
+        """
+        return self.view()
+
+    def view(self) -> types.MappingProxyType:
+        """ Returns a read-only view of the data without copying
+        """
+        return types.MappingProxyType(self._data)
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self._data!r})'
+
     def to_dict(self):
-        return self.data.copy()
+        return self._data.copy()
+
+
+class Batch:
+    """ Collects writes to a database and commits them in one call to
+            Database.set_many. Usage:
+
+        with CTX.db.batch() as batch:
+            batch.set(ref=ref_a, snapshot=snapshot_a)
+            batch.set(ref=ref_b, snapshot=snapshot_b)
+
+    """
+
+    def __init__(self, database, transaction=_NA):
+        self._database = database
+        self._transaction = transaction
+        self._writes = list()
+
+    def set(self, ref: Reference, snapshot: Snapshot):
+        self._writes.append((ref, snapshot))
+
+    def __len__(self):
+        return len(self._writes)
+
+    def commit(self):
+        writes, self._writes = self._writes, list()
+        if len(writes) != 0:
+            self._database.set_many(writes, transaction=self._transaction)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.commit()
 
 
 class Database:
@@ -144,6 +338,23 @@ class Database:
     def set(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
         raise NotImplementedError
 
+    @classmethod
+    def set_many(cls, items: [(Reference, Snapshot)], transaction=_NA):
+        """ Writes multiple documents. Backends override this to write
+                in as few round trips as possible; the default falls
+                back to one set per document.
+
+        :param items: iterable of (ref, snapshot)
+        :param transaction:
+        :return:
+        """
+        for ref, snapshot in items:
+            cls.set(ref=ref, snapshot=snapshot, transaction=transaction)
+
+    @classmethod
+    def batch(cls, transaction=_NA) -> Batch:
+        return Batch(database=cls, transaction=transaction)
+
     @classmethod
     @abc.abstractmethod
     def get(cls, ref: Reference, transaction=_NA):
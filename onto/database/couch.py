@@ -23,3 +23,27 @@ class CouchDatabase(Database):
             '_id': _id,
             **snapshot
         })
+
+    @classmethod
+    def set_many(cls, items: [(Reference, Snapshot)], transaction=_NA):
+        """ Saves documents with one _bulk_docs request per database
+
+        :param items: iterable of (ref, snapshot)
+        :param transaction:
+        :return:
+        """
+
+        if transaction is not _NA:
+            raise ValueError
+
+        from collections import defaultdict
+        dbs = defaultdict(list)
+        for ref, snapshot in items:
+            dbs[ref.first].append({
+                '_id': ref.last,
+                **snapshot
+            })
+
+        for k, docs in dbs.items():
+            db = cls.server()[k]
+            db.update(docs)
@@ -16,6 +16,22 @@ class CouchbaseDatabase(Database):
             key=ref.last, value=snapshot.to_dict()
         )
 
+    @classmethod
+    def set_many(cls, items: [(Reference, Snapshot)], transaction=_NA):
+        """ Upserts documents with one upsert_multi per collection
+
+        :param items: iterable of (ref, snapshot)
+        :param transaction:
+        :return:
+        """
+        from collections import defaultdict
+        collections = defaultdict(dict)
+        for ref, snapshot in items:
+            collections[ref.first][ref.last] = snapshot.to_dict()
+        for collection_name, docs in collections.items():
+            cls.bucket().collection(
+                collection_name=collection_name).upsert_multi(docs)
+
     @classmethod
     def create(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
         cls.bucket().collection(collection_name=ref.first).insert(
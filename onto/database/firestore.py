@@ -19,22 +19,24 @@ FirestoreListener = None
 
 class FirestoreReference(Reference):
 
+    __slots__ = ()
+
     def is_collection(self):
-        return len(self.params) % 2 == 1
+        return len(self._path) % 2 == 1
 
     @property
     def collection(self):
         return self.first
 
     def is_document(self):
-        return len(self.params) % 2 == 0
+        return len(self._path) % 2 == 0
 
     def is_collection_group(self):
-        return self.first == "**" and len(self.params) == 2
+        return self.first == "**" and len(self._path) == 2
 
     @classmethod
     def from__document_name(cls, document_name: str):
-        return cls.from_str(document_name)
+        return cls.from_str(document_name, intern=True)
 
     @classmethod
     def from_document_reference(cls, ref: DocumentReference):
@@ -49,6 +51,11 @@ class FirestoreDatabase(Database):
 
     firestore_client = None
 
+    MAX_BATCH_SIZE = 500
+    """
+    Maximum number of writes that Firestore accepts in one WriteBatch 
+    """
+
     @classmethod
     def listener(cls):
         return FirestoreListener
@@ -118,10 +125,43 @@ class FirestoreDatabase(Database):
         # )
 
         if transaction is None:
-            doc_ref.set(document_data=snapshot.to_dict(), **kwargs)
+            doc_ref.set(document_data=snapshot.view(), **kwargs)
         else:
             transaction.set(reference=doc_ref,
-                            document_data=snapshot.to_dict(), **kwargs)
+                            document_data=snapshot.view(), **kwargs)
+
+    @classmethod
+    def set_many(cls, items: [(Reference, Snapshot)], transaction=_NA,
+                 **kwargs):
+        """ Writes documents with WriteBatch; chunks of MAX_BATCH_SIZE
+                are committed separately. Writes are added to the
+                transaction instead when one is in progress.
+
+        :param items: iterable of (ref, snapshot)
+        :param transaction:
+        :param kwargs: forwarded to WriteBatch.set (eg. merge=True)
+        :return:
+        """
+
+        if transaction is _NA:
+            transaction = CTX.transaction_var.get()
+
+        if transaction is not None:
+            for ref, snapshot in items:
+                transaction.set(reference=cls._doc_ref_from_ref(ref),
+                                document_data=snapshot.view(), **kwargs)
+            return
+
+        batch, size = cls.firestore_client.batch(), 0
+        for ref, snapshot in items:
+            batch.set(reference=cls._doc_ref_from_ref(ref),
+                      document_data=snapshot.view(), **kwargs)
+            size += 1
+            if size == cls.MAX_BATCH_SIZE:
+                batch.commit()
+                batch, size = cls.firestore_client.batch(), 0
+        if size != 0:
+            batch.commit()
 
     @classmethod
     def get(cls, ref: Reference, transaction=_NA):
@@ -183,6 +223,8 @@ class FirestoreDatabase(Database):
 
 class FirestoreSnapshot(Snapshot):
 
+    __slots__ = ()
+
     @classmethod
     def from_document_snapshot(
             cls, document_snapshot: firestore.DocumentSnapshot):
@@ -215,19 +257,98 @@ class FirestoreSnapshot(Snapshot):
                 for key, val in kwargs.items()
                 if key != DATA_KEYWORD
             }
-            return cls(**data, __onto_meta__=__onto_meta__)
+            return cls(data, __onto_meta__=__onto_meta__)
 
     @classmethod
-    def empty(cls, **kwargs):
+    def empty(cls, exists=False, **kwargs):
+        """
+
+        :param exists: False, or None when the state is unknown
+        :param kwargs:
+        :return:
+        """
         return cls.from_data_and_meta(
             data=dict(),
-            exists=False,
+            exists=exists,
             **kwargs
         )
 
 
-from threading import Lock, Condition
+class LazyFirestoreSnapshot(FirestoreSnapshot):
+    """
+    Snapshot of a document from the watch stream that keeps the protobuf
+        fields of the document, and decodes each value on first access.
+        Decoded values are memoized.
+    """
+
+    __slots__ = ('_fields', '_client')
+
+    def __init__(self, fields, client, __onto_meta__=None):
+        """
+
+        :param fields: google.cloud.firestore_v1.types.Document.fields
+        :param client: firestore client for decoding references
+        :param __onto_meta__:
+        """
+        super().__init__(__onto_meta__=__onto_meta__)
+        self._fields = fields
+        self._client = client
+
+    @classmethod
+    def from_fields_and_meta(cls, fields, client, **kwargs):
+        """ Usage: snapshot = LazyFirestoreSnapshot.from_fields_and_meta(
+                    fields=document.fields,
+                    client=firestore_client,
+                    exists=True,
+                    ...
+                )
+        """
+        return cls(fields=fields, client=client, __onto_meta__=kwargs)
+
+    def __getitem__(self, key):
+        try:
+            return self._data[key]
+        except KeyError:
+            # Indexing a protobuf map with a missing key inserts the key
+            if key not in self._fields:
+                raise
+            from google.cloud.firestore_v1 import _helpers
+            val = _helpers.decode_value(self._fields[key], self._client)
+            self._data[key] = val
+            return val
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def _decode_all(self) -> dict:
+        if len(self._data) != len(self._fields):
+            for key in self._fields:
+                self[key]
+        return self._data
+
+    def view(self):
+        """ The snapshot is itself a read-only mapping; values are
+                decoded on access
+        """
+        return self
+
+    def to_dict(self):
+        return self._decode_all().copy()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self._decode_all()!r})'
+
+
+from threading import Lock, Condition, Timer
 import heapq
+import itertools
+import time
 
 
 TARGET_ID_RANGE = (32, 64)
@@ -238,13 +359,18 @@ class TargetIdAssigner:
     For now, we allow 32 concurrent targets to test that overflow is handled.
     """
 
-    def __init__(self):
+    def __init__(self, id_range=TARGET_ID_RANGE):
         self.lock = Lock()
         self.sold_out = Condition()
         with self.lock, self.sold_out:
-            self._heap = list(range(*TARGET_ID_RANGE))
+            self._heap = list(range(*id_range))
             heapq.heapify(self._heap)
 
+    def __len__(self):
+        """ Number of ids available
+        """
+        return len(self._heap)
+
     def assign_id(self):
         with self.lock, self.sold_out:
             while not len(self._heap) > 0:
@@ -258,6 +384,254 @@ class TargetIdAssigner:
             self.sold_out.notify(n=1)
 
 
+class _WatchShard:
+
+    def __init__(self, id_range):
+        self.watch = None
+        self.assigner = TargetIdAssigner(id_range=id_range)
+        # target_id -> (target, callback)
+        self.targets = dict()
+        # Consecutive streams that terminated without recovery
+        self.n_retries = 0
+        self.opened_at = None
+
+    @property
+    def n_targets(self):
+        return len(self.targets)
+
+
+class WatchPool:
+    """
+    Shards targets across watch streams. Each stream has its own target
+        id space of id_range, so that the number of targets is not
+        limited by id_range. A stream is opened when all streams are
+        full, and closed once its last target is released. New targets
+        are added to the fullest stream that has room, so that targets
+        consolidate onto fewer streams as others are released (targets
+        are not moved between live streams, since re-adding a target
+        delivers all of its documents again).
+
+    When a stream terminates without recovery, a new stream is opened in
+        its place after a backoff, and its targets are added again. After
+        MAX_RETRIES consecutive failures the targets of the stream are
+        dropped and on_error is invoked.
+
+    When the server removes a target that was added with a resume token
+        (for example, since the token expired), the target is added
+        again without it and on_resync is invoked. Other targets removed
+        by the server are dropped and on_error is invoked.
+
+    Targets are identified by a handle that is unique across streams.
+    """
+
+    MAX_RETRIES = 5
+
+    BACKOFF = 1.0
+    """ Seconds to wait before the first retry; doubles with each retry
+        (up to MAX_BACKOFF) """
+
+    MAX_BACKOFF = 60.0
+
+    STABLE_AFTER = 60.0
+    """ A stream that ran for this many seconds resets the retry count """
+
+    def __init__(self, watch_factory, id_range=TARGET_ID_RANGE,
+                 on_error=None, on_resync=None):
+        """
+
+        :param watch_factory: callable that opens a new watch stream
+        :param id_range: target ids of each stream
+        :param on_error: invoked as on_error(handles, reason) when the
+            targets of handles are dropped
+        :param on_resync: invoked as on_resync(handle) when the target
+            of handle is added again without its resume token
+        """
+        self._watch_factory = watch_factory
+        self._id_range = id_range
+        self.on_error = on_error
+        self.on_resync = on_resync
+        self._lock = Lock()
+        self._shards = list()
+        self._handles = dict()
+        self._next_handle = itertools.count(id_range[0])
+
+    @property
+    def n_watches(self) -> int:
+        return len(self._shards)
+
+    def __len__(self):
+        """ Number of targets
+        """
+        return len(self._handles)
+
+    def _shard_with_room(self) -> _WatchShard:
+        shards = [shard for shard in self._shards
+                  if len(shard.assigner) != 0]
+        if len(shards) != 0:
+            return max(shards, key=lambda shard: shard.n_targets)
+        shard = _WatchShard(id_range=self._id_range)
+        shard.watch = self._open_watch(shard)
+        self._shards.append(shard)
+        return shard
+
+    def _open_watch(self, shard):
+        watch = self._watch_factory()
+        shard.opened_at = time.monotonic()
+        if hasattr(watch, 'add_done_callback'):
+            watch.add_done_callback(
+                functools.partial(self._on_watch_done, shard))
+        if hasattr(watch, 'add_target_removed_callback'):
+            watch.add_target_removed_callback(
+                functools.partial(self._on_target_removed, shard))
+        return watch
+
+    def _on_target_removed(self, shard, target_id, cause):
+        """ Adds a target that the server removed for its resume token
+                again without the token; drops other removed targets
+        """
+        with self._lock:
+            if target_id not in shard.targets:
+                return
+            target, callback = shard.targets[target_id]
+            handle = next(h for h, (s, _id) in self._handles.items()
+                          if s is shard and _id == target_id)
+            if "resume_token" in target:
+                target = {k: v for k, v in target.items()
+                          if k != "resume_token"}
+                shard.targets[target_id] = (target, callback)
+                watch = shard.watch
+            else:
+                watch = None
+        if watch is None:
+            _LOGGER.error(f"Target {handle} removed by {cause}")
+            self._rollback(handle)
+            if self.on_error is not None:
+                self.on_error([handle], cause)
+            return
+        _LOGGER.warning(f"Resume token of target {handle} rejected by "
+                        f"{cause}; delivering all of its documents again")
+        if self.on_resync is not None:
+            self.on_resync(handle)
+        watch.add_target(target, callback)
+
+    def _on_watch_done(self, shard, reason):
+        """ Schedules replacing a stream that terminated without recovery
+        """
+        with self._lock:
+            if shard not in self._shards:
+                return
+            if time.monotonic() - shard.opened_at >= self.STABLE_AFTER:
+                shard.n_retries = 0
+            if shard.n_retries >= self.MAX_RETRIES:
+                handles = self._drop_shard(shard)
+            else:
+                handles = None
+                delay = min(self.BACKOFF * 2 ** shard.n_retries,
+                            self.MAX_BACKOFF)
+                shard.n_retries += 1
+        if handles is not None:
+            _LOGGER.error(f"Watch stream terminated by {reason}; "
+                          f"giving up on targets {handles}")
+            if self.on_error is not None:
+                self.on_error(handles, reason)
+            return
+        _LOGGER.warning(f"Watch stream terminated by {reason}; "
+                        f"re-opening in {delay} seconds")
+        if delay == 0:
+            self._reopen(shard)
+        else:
+            timer = Timer(delay, self._reopen, args=(shard,))
+            timer.daemon = True
+            timer.start()
+
+    def _reopen(self, shard):
+        with self._lock:
+            if shard not in self._shards:
+                return
+            shard.watch = watch = self._open_watch(shard)
+            targets = list(shard.targets.items())
+        try:
+            for target_id, (target, callback) in targets:
+                watch.add_target(target, callback)
+        except Exception as e:
+            # For example, the stream did not open within READY_TIMEOUT;
+            #   close() does not invoke the done callback
+            watch.close()
+            self._on_watch_done(shard, e)
+
+    def _drop_shard(self, shard) -> list:
+        """ Removes shard and returns handles of its targets; call
+                with self._lock held
+        """
+        self._shards.remove(shard)
+        handles = [handle for handle, (s, _) in self._handles.items()
+                   if s is shard]
+        for handle in handles:
+            del self._handles[handle]
+        shard.targets.clear()
+        return handles
+
+    def add_target(self, target: dict, callback) -> int:
+        """ Adds a target to a stream.
+
+        :param target: target without "target_id"
+        :param callback: invoked as callback(handle, target_id, protos,
+            read_time), where target_id is the id in the stream
+        :return: handle of the target
+        :raises TimeoutError: when the stream does not open in time; the
+            target is not added
+        """
+        with self._lock:
+            shard = self._shard_with_room()
+            target_id = shard.assigner.assign_id()
+            handle = next(self._next_handle)
+            self._handles[handle] = (shard, target_id)
+            target = {**target, "target_id": target_id}
+            callback = functools.partial(callback, handle)
+            shard.targets[target_id] = (target, callback)
+            watch = shard.watch
+        try:
+            watch.add_target(target, callback)
+        except Exception:
+            self._rollback(handle)
+            raise
+        return handle
+
+    def _rollback(self, handle):
+        with self._lock:
+            shard, target_id = self._handles.pop(handle, (None, None))
+            if shard is None:
+                return
+            shard.assigner.release_id(target_id)
+            del shard.targets[target_id]
+            if shard.n_targets == 0 and shard in self._shards:
+                self._shards.remove(shard)
+                shard.watch.close()
+
+    def remove_target(self, handle):
+        with self._lock:
+            shard, target_id = self._handles.pop(handle)
+            shard.watch.remove_target(target_id)
+            shard.assigner.release_id(target_id)
+            del shard.targets[target_id]
+            if shard.n_targets == 0:
+                self._shards.remove(shard)
+                shard.watch.close()
+
+    def close(self) -> list:
+        """ Closes all streams
+
+        :return: handles of the targets that were removed
+        """
+        with self._lock:
+            shards, self._shards = self._shards, list()
+            handles = list(self._handles.keys())
+            self._handles.clear()
+        for shard in shards:
+            shard.watch.close()
+        return handles
+
+
 _LOGGER = CTX.logger
 
 
@@ -306,16 +680,25 @@ def timestamp_key(t) -> tuple:
 
 class FirestoreListener(Listener):
 
-    _watch = None
-    _containers = defaultdict(SnapshotContainer)
+    retention = dict(max_versions=1, max_age=None)
+    """
+    Keyword arguments for the SnapshotContainer of each target; versions
+        that are consumed and not retained are removed after each read
+        window (see FirestoreSource.delta)
+    """
+
+    _containers = defaultdict(
+        lambda: SnapshotContainer(**FirestoreListener.retention))
 
     @classmethod
-    def _get_watch(cls):
+    def _new_watch(cls):
 
         from onto.context import Context as CTX
         from onto.watch import _Watch
 
-        cls._watch = _Watch(
+        # The stream opens in the background; _Watch.add_target waits
+        #   for it to be ready
+        return _Watch(
             # document_reference=None,
             firestore=CTX.db.firestore_client,
             comparator=lambda d1, d2: 1,
@@ -323,21 +706,49 @@ class FirestoreListener(Listener):
             document_reference_cls=DocumentReference,
         )
 
-        while not cls._watch._rpc.is_active:
-            # TODO: change; This is a temporary impl; wait may never stop
-            import time
-            time.sleep(0.020)
+    _watches = None
+
+    @classmethod
+    def _get_watches(cls) -> WatchPool:
+        if cls._watches is None:
+            cls._watches = WatchPool(
+                watch_factory=cls._new_watch, on_error=cls._on_watch_error,
+                on_resync=cls._on_target_resync)
+        return cls._watches
 
-        return cls._watch
+    @classmethod
+    def _on_watch_error(cls, handles, reason):
+        """ Forgets targets whose stream failed MAX_RETRIES times
+        """
+        for handle in handles:
+            cls._registry.pop(handle, None)
+            cls._containers.pop(handle, None)
+            cls._target_keys.pop(handle, None)
 
-    _assigner = TargetIdAssigner()
+    @classmethod
+    def close(cls):
+        """ Closes all watch streams; streams are opened again when
+                targets are added
+        """
+        if cls._watches is not None:
+            for handle in cls._watches.close():
+                cls._registry.pop(handle, None)
+                cls._containers.pop(handle, None)
+                cls._target_keys.pop(handle, None)
+            cls._watches = None
 
     @classmethod
     def register(cls, query, source):
+        from onto.coordinator import Coordinator
+        source._coalesced = \
+            cls._coordinator.overflow == Coordinator.COALESCE
+
         def callback(*args, **kwargs):
             f = functools.partial(source._call, *args, **kwargs)
-            cls._coordinator._add_awaitable(f)
-        target_id = cls.for_query(query=query, cb=callback)
+            # Read windows of one source are processed in order
+            cls._coordinator._add_awaitable(f, key=id(source))
+        target_id = cls.for_query(
+            query=query, cb=callback, name=source.checkpoint_name)
         cls._registry[target_id] = source
 
     @classmethod
@@ -345,7 +756,7 @@ class FirestoreListener(Listener):
         raise NotImplementedError
 
     @classmethod
-    def _process_proto(cls, target_id, proto):
+    def _process_proto(cls, target_id, proto, container=None):
         """
 
         This method is ported from from google.cloud.firestore_v1.watch
@@ -368,11 +779,13 @@ class FirestoreListener(Listener):
         Difference from source code: the way document_change is stored
 
         :param proto:
-        :param target_id:
+        :param target_id: id of the target in the watch stream
+        :param container: defaults to the container of target_id
         :return:
         """
 
-        container = cls._containers[target_id]
+        if container is None:
+            container = cls._containers[target_id]
 
         _firestore = CTX.db.firestore_client
 
@@ -402,9 +815,6 @@ class FirestoreListener(Listener):
 
                 # google.cloud.firestore_v1.types.Document
                 document = document_change.document
-                # TODO: change
-                from google.cloud.firestore_v1 import _helpers
-                data = _helpers.decode_dict(document.fields, _firestore)
 
                 # Create a snapshot. As Document and Query objects can be
                 # passed we need to get a Document Reference in a more manual
@@ -416,9 +826,17 @@ class FirestoreListener(Listener):
 
                 ref = FirestoreReference.from__document_name(document_name)
 
-                snapshot = FirestoreSnapshot.from_data_and_meta(
+                if cls._is_unchanged(container, ref, document):
+                    # Re-sent without changes (for example, after a RESET
+                    #   or when a stream is resumed)
+                    _LOGGER.debug(f"on_snapshot: {ref} is unchanged")
+                    return
+
+                # Fields are decoded when read
+                snapshot = LazyFirestoreSnapshot.from_fields_and_meta(
                     # reference=document_ref,
-                    data=data,
+                    fields=document.fields,
+                    client=_firestore,
                     exists=True,
                     read_time=None,
                     create_time=document.create_time,
@@ -463,6 +881,12 @@ class FirestoreListener(Listener):
                     read_time=document_delete.read_time
             )
 
+            if not container.has_previous(ref):
+                # Deleted before it was tracked (for example, while the
+                #   listener was down): there is no version to delete
+                _LOGGER.debug(f"on_snapshot: {ref} is not tracked")
+                return
+
             prev = container.previous(ref)
             prev.next = snapshot
             snapshot.prev = prev
@@ -475,6 +899,16 @@ class FirestoreListener(Listener):
         else:
             raise ValueError  # TODO: implement
 
+    @staticmethod
+    def _is_unchanged(container, ref, document) -> bool:
+        """ Returns True if the latest version of ref in container is of
+                the same update_time as document
+        """
+        if not container.has_previous(ref):
+            return False
+        prev = container.previous(ref)
+        return bool(prev.exists) and prev.update_time == document.update_time
+
     @classmethod
     def _trim_document_name(cls, _firestore, document_name):
         db_str = _firestore._database_string
@@ -484,18 +918,90 @@ class FirestoreListener(Listener):
         return document_name
 
     @classmethod
-    def callback(cls, target_id, protos, read_time, *, cb):
-        container = cls._containers[target_id]
+    def callback(cls, handle, target_id, protos, read_time, *, cb,
+                 key=None, resume_token=None):
+        container = cls._containers[handle]
         with container.lock:
+            if container.checkpoint is None and key is not None \
+                    and cls.resume_token_store is not None:
+                container.checkpoint = functools.partial(
+                    cls.resume_token_store.set, key)
             for proto in protos:
-                cls._process_proto(target_id, proto)
-            container._read_times.append(
-                (read_time.seconds, read_time.nanos)
+                cls._process_proto(target_id, proto, container=container)
+            container.add_read_time(
+                (read_time.seconds, read_time.nanos),
+                resume_token=resume_token
             )
-            cb(container)
+        # Enqueued after the lock is released: the put may block on a
+        #   bounded queue until a worker, which takes container.lock,
+        #   consumes a task
+        cb(container)
+
+    resume_token_store = None
+    """
+    ResumeTokenStore for checkpoints of targets. If set, a target added
+        with for_query or for_refs resumes from the resume token saved
+        when its last read window was consumed, so that only changes
+        made since then are delivered. Note that documents changed since
+        then are delivered as created (their previous versions are not
+        known). Documents deleted since then are not delivered, since
+        they are not tracked.
+
+    A checkpoint is kept for each name and target; a target whose
+        checkpoint is in use by another target is not checkpointed.
+        When the server rejects a resume token (for example, once it
+        expires), the checkpoint is deleted and all documents of the
+        target are delivered again.
+    """
+
+    _target_keys = dict()
+
+    @staticmethod
+    def _target_key(target: dict, name=None) -> str:
+        """ Identifies a target across restarts
+
+        :param name: identifies the owner of the target, so that owners
+            of the same target keep separate checkpoints
+        """
+        import hashlib
+        if "query" in target:
+            s = target["query"].SerializeToString()
+        else:
+            s = "\n".join(target["documents"]["documents"]).encode()
+        if name is not None:
+            s = name.encode() + b"\n" + s
+        return hashlib.sha1(s).hexdigest()
 
     @classmethod
-    def for_query(cls, query: Query, cb):
+    def _add_target(cls, target: dict, cb, name=None):
+        key = cls._target_key(target, name=name)
+        if key in cls._target_keys.values():
+            _LOGGER.warning(f"Checkpoint {key} is in use by another "
+                            f"target; the target is not checkpointed")
+            key = None
+        elif cls.resume_token_store is not None:
+            checkpoint = cls.resume_token_store.get(key)
+            if checkpoint is not None:
+                resume_token, _ = checkpoint
+                target = {**target, "resume_token": resume_token}
+        handle = cls._get_watches().add_target(
+            target, functools.partial(cls.callback, cb=cb, key=key)
+        )
+        if key is not None:
+            cls._target_keys[handle] = key
+        return handle
+
+    @classmethod
+    def _on_target_resync(cls, handle):
+        """ Deletes the checkpoint of a target whose resume token was
+                rejected
+        """
+        key = cls._target_keys.get(handle, None)
+        if key is not None and cls.resume_token_store is not None:
+            cls.resume_token_store.delete(key)
+
+    @classmethod
+    def for_query(cls, query: Query, cb, name=None):
         query = query._to_firestore_query()
         parent_path, _ = query._parent._parent_info()
         from google.cloud.firestore_v1.proto import firestore_pb2
@@ -503,32 +1009,29 @@ class FirestoreListener(Listener):
             parent=parent_path, structured_query=query._to_protobuf()
         )
 
-        target_id = cls._assigner.assign_id()
         target = {
             "query": query_target,
-            "target_id": target_id
         }
-        import functools
-        cls._get_watch().add_target(
-            target, functools.partial(cls.callback, cb=cb)
-        )
-
-        return target_id
+        return cls._add_target(target, cb=cb, name=name)
 
     @classmethod
-    def for_refs(cls, refs: List[FirestoreReference], cb):
+    def for_refs(cls, refs: List[FirestoreReference], cb, name=None):
         documents = [FirestoreDatabase.make_document_path(ref) for ref in refs]
-        target_id = cls._assigner.assign_id()
         target = {
             "documents": {"documents": documents},
-            "target_id": target_id,
         }
-        import functools
-        cls._get_watch().add_target(
-            target, functools.partial(cls.callback, cb=cb)
-        )
-        return target_id
+        return cls._add_target(target, cb=cb, name=name)
 
     @classmethod
     def release_target(cls, target_id):
-        cls._watch.remove_target(target_id)
+        """
+
+        :param target_id: handle returned by for_query or for_refs
+        :return:
+        """
+        cls._get_watches().remove_target(target_id)
+        cls._registry.pop(target_id, None)
+        cls._containers.pop(target_id, None)
+        key = cls._target_keys.pop(target_id, None)
+        if key is not None and cls.resume_token_store is not None:
+            cls.resume_token_store.delete(key)
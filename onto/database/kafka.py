@@ -17,58 +17,299 @@ FirestoreListener = None
 
 class KafkaReference(Reference):
 
+    __slots__ = ()
+
     def is_collection(self):
-        return len(self.params) % 2 == 1
+        return len(self._path) % 2 == 1
 
     @property
     def collection(self):
         return self.first
 
     def is_document(self):
-        return len(self.params) % 2 == 0
+        return len(self._path) % 2 == 0
 
     @classmethod
     def from__document_name(cls, document_name: str):
-        return cls.from_str(document_name)
+        return cls.from_str(document_name, intern=True)
 
     @property
     def _document_path(self):
         return str(self)
 
 
+class KafkaProducerPool:
+    """ Keeps one started AIOKafkaProducer for each event loop, so that
+            publishing does not connect to the broker every time.
+            Context.kafka_producer_pool returns the process-wide pool,
+            which is closed on exit.
+
+    A producer is stopped on its own event loop: by stop(), or when the
+        task that guards it is cancelled, as asyncio.run does to pending
+        tasks before closing the loop.
+
+    Only publishers that run on an event loop send through the pool:
+        GraphQL sinks and KafkaDatabase.set_async. The sync
+        KafkaDatabase.set, set_many and delete send with the long-lived
+        kafka-python producer of KafkaDatabase.kafka_producer, which
+        batches as well.
+    """
+
+    # KafkaDatabase.PRODUCER_CONFIG_KEYS that are named differently
+    #   (or are not supported) by AIOKafkaProducer
+    _RENAMED_KEYS = {
+        'batch_size': 'max_batch_size',
+        'retries': None,
+        'max_in_flight_requests_per_connection': None,
+    }
+
+    def __init__(self, bootstrap_servers=None, linger_ms=5,
+                 **producer_config):
+        """
+
+        :param bootstrap_servers: defaults to
+            KafkaDatabase.bootstrap_servers and then to localhost
+        :param linger_ms: time to wait for more messages to send in the
+            same batch
+        :param producer_config: keyword arguments for AIOKafkaProducer;
+            KafkaDatabase.producer_config keys are accepted
+        """
+        self.bootstrap_servers = bootstrap_servers
+        self.producer_config = dict(linger_ms=linger_ms)
+        for key, val in producer_config.items():
+            key = self._RENAMED_KEYS.get(key, key)
+            if key is not None:
+                self.producer_config[key] = val
+        self._producers = dict()
+        self._locks = dict()
+        self._guards = dict()
+
+    async def get(self):
+        """ Returns the started producer of the running event loop
+        """
+        import asyncio
+        loop = asyncio.get_event_loop()
+        if loop not in self._producers:
+            lock = self._locks.setdefault(loop, asyncio.Lock())
+            async with lock:
+                if loop not in self._producers:
+                    from aiokafka import AIOKafkaProducer
+                    bootstrap_servers = self.bootstrap_servers
+                    if bootstrap_servers is None:
+                        bootstrap_servers = \
+                            KafkaDatabase.bootstrap_servers or 'localhost:9092'
+                    producer = AIOKafkaProducer(
+                        bootstrap_servers=bootstrap_servers,
+                        **self.producer_config
+                    )
+                    await producer.start()
+                    self._producers[loop] = producer
+                    self._guards[loop] = asyncio.ensure_future(
+                        self._stop_when_cancelled())
+        return self._producers[loop]
+
+    async def _stop_when_cancelled(self):
+        import asyncio
+        try:
+            await asyncio.get_event_loop().create_future()
+        except asyncio.CancelledError:
+            await self.stop()
+            raise
+
+    async def send(self, topic, value=None, key=None, headers=None):
+        """ Adds a message to the batch of the producer
+
+        :return: future of the delivery
+        """
+        if isinstance(value, str):
+            value = value.encode(encoding='utf-8')
+        if isinstance(key, str):
+            key = key.encode(encoding='utf-8')
+        producer = await self.get()
+        return await producer.send(
+            topic=topic, value=value, key=key, headers=headers)
+
+    async def send_and_wait(self, *args, **kwargs):
+        """ Sends a message and waits for its delivery
+        """
+        future = await self.send(*args, **kwargs)
+        return await future
+
+    async def stop(self):
+        """ Stops the producer of the running event loop, delivering
+                pending messages
+        """
+        import asyncio
+        loop = asyncio.get_event_loop()
+        producer = self._producers.pop(loop, None)
+        self._locks.pop(loop, None)
+        guard = self._guards.pop(loop, None)
+        if guard is not None and guard is not asyncio.current_task():
+            guard.cancel()
+            await asyncio.gather(guard, return_exceptions=True)
+        if producer is not None:
+            await producer.stop()
+
+    def close(self, timeout=10):
+        """ Stops producers of all event loops from their own loop,
+                delivering pending messages.
+
+        :raises RuntimeError: when called from a loop that has a producer;
+            await stop() there instead
+        """
+        import asyncio
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running in self._producers:
+            raise RuntimeError('close() would block the event loop of a '
+                               'producer; await stop() instead')
+        for loop in list(self._producers):
+            if loop.is_closed():
+                # Closed without cancelling pending tasks
+                CTX.logger.warning(
+                    'Discarding Kafka producer of a closed event loop; '
+                    'its pending messages are not delivered')
+                self._producers.pop(loop, None)
+            elif loop.is_running():
+                asyncio.run_coroutine_threadsafe(
+                    self.stop(), loop).result(timeout=timeout)
+            else:
+                loop.run_until_complete(self.stop())
+        self._producers.clear()
+        self._locks.clear()
+        self._guards.clear()
+
+
 class KafkaDatabase(Database):
 
     bootstrap_servers = None
 
+    PRODUCER_CONFIG_KEYS = (
+        'linger_ms',
+        'batch_size',
+        'compression_type',
+        'acks',
+        'retries',
+        'max_in_flight_requests_per_connection',
+    )
+
+    # Keyword arguments for KafkaProducer; set from the kafka database
+    #   config in Context.create_db
+    producer_config = dict()
+
+    # Codec (or codec id) of message values (see onto.codec)
+    codec = 'json'
+
     @classmethod
     @functools.lru_cache(maxsize=None)
     def kafka_producer(cls) -> kafka.KafkaProducer:
         from kafka import KafkaProducer
-        producer = KafkaProducer(bootstrap_servers=[cls.bootstrap_servers])
+        producer = KafkaProducer(
+            bootstrap_servers=[cls.bootstrap_servers],
+            **cls.producer_config
+        )
         return producer
 
+    @classmethod
+    def close_producer(cls, timeout=None):
+        """ Delivers pending messages and closes the producer, if it was
+                created; the next call to kafka_producer creates a new one
+
+        :param timeout: seconds to wait
+        """
+        if cls.kafka_producer.cache_info().currsize != 0:
+            cls.kafka_producer().close(timeout=timeout)
+        cls.kafka_producer.cache_clear()
+
+    @staticmethod
+    def _encode_key(ref: Reference) -> bytes:
+        return ref.id.encode(encoding='utf-8')
+
+    @classmethod
+    def _encode_value(cls, snapshot: Snapshot, codec=None):
+        """ Returns the message value and headers of the snapshot
+        """
+        from onto.codec import get_codec, CODEC_HEADER
+        codec = get_codec(codec if codec is not None else cls.codec)
+        headers = [(CODEC_HEADER, codec.codec_id.encode(encoding='utf-8'))]
+        return codec.encode(snapshot.to_dict()), headers
+
     @classmethod
     def set(cls, ref: Reference, snapshot: Snapshot, transaction=_NA,
-            **kwargs):
-        d = snapshot.to_dict()
-        import json
-        s = json.dumps(d)
-        b = s.encode(encoding='utf-8')
-        bk = ref.id.encode(encoding='utf-8')
-        cls.kafka_producer().send(topic=ref.collection, key=bk, value=b, **kwargs)
+            codec=None, **kwargs):
+        """ Sends the document to the topic of its collection with the
+                sync producer (see kafka_producer); on an event loop, use
+                set_async to send through the producer pool instead
+
+        :param codec: overrides KafkaDatabase.codec
+        :return: future of the delivery (FutureRecordMetadata); call
+            .get(timeout) to wait for the broker to acknowledge it
+        """
+        value, headers = cls._encode_value(snapshot, codec=codec)
+        return cls.kafka_producer().send(
+            topic=ref.collection,
+            key=cls._encode_key(ref),
+            value=value,
+            headers=headers,
+            **kwargs
+        )
+
+    @classmethod
+    def set_many(cls, items: [(Reference, Snapshot)], transaction=_NA):
+        """ Sends documents without waiting for each delivery, so that
+                the producer batches them (see linger_ms and batch_size).
+
+        :param items: iterable of (ref, snapshot)
+        :return: list of futures of the deliveries, in order of items
+        """
+        return [cls.set(ref=ref, snapshot=snapshot, transaction=transaction)
+                for ref, snapshot in items]
+
+    @classmethod
+    async def set_async(cls, ref: Reference, snapshot: Snapshot, codec=None):
+        """ Sends the document with the producer of the running event
+                loop (see Context.kafka_producer_pool)
+
+        :return: future of the delivery
+        """
+        value, headers = cls._encode_value(snapshot, codec=codec)
+        return await CTX.kafka_producer_pool().send(
+            topic=ref.collection,
+            key=cls._encode_key(ref),
+            value=value,
+            headers=headers
+        )
+
+    @classmethod
+    def flush(cls, timeout=None):
+        """ Blocks until all documents sent so far are delivered
+
+        :param timeout: seconds to wait
+        """
+        cls.kafka_producer().flush(timeout=timeout)
 
     update = set
     create = set
 
     @classmethod
     def delete(cls, ref: Reference, transaction=_NA):
-        cls.kafka_producer().send(topic=ref.collection, key=ref.id, value=None)
+        """ Sends a tombstone (null value) for the key of the document
+                with the sync producer, so that compacted topics remove it.
+
+        :return: future of the delivery
+        """
+        return cls.kafka_producer().send(
+            topic=ref.collection, key=cls._encode_key(ref), value=None)
 
     ref = KafkaReference()
 
 
 class KafkaSnapshot(Snapshot):
 
+    __slots__ = ()
+
     @classmethod
     def from_data_and_meta(
             cls, **kwargs):
@@ -87,7 +328,21 @@ class KafkaSnapshot(Snapshot):
                 for key, val in kwargs.items()
                 if key != DATA_KEYWORD
             }
-            return cls(**data, __onto_meta__=__onto_meta__)
+            return cls(data, __onto_meta__=__onto_meta__)
+
+    @classmethod
+    def from_message(cls, message, codec=None):
+        """ Decodes the value of a consumed message with the codec named
+                in its headers
+
+        :param codec: codec for messages without the codec header
+        """
+        from onto.codec import codec_of
+        if message.value is None:
+            # Tombstone
+            return cls.empty()
+        d = codec_of(message.headers, default=codec).decode(message.value)
+        return cls.from_data_and_meta(data=d, exists=True)
 
     @classmethod
     def empty(cls, **kwargs):
@@ -30,6 +30,21 @@ class LeancloudDatabase(Database):
         obj = cla(_doc_id=object_id, **snapshot.to_dict())
         obj.save()
 
+    @classmethod
+    def set_many(cls, items: [(Reference, Snapshot)], transaction=_NA):
+        """ Saves objects with one Object.save_all call
+
+        :param items: iterable of (ref, snapshot)
+        :param transaction:
+        :return:
+        """
+        objs = [
+            cls._get_cla(ref.first)(_doc_id=ref.last, **snapshot.to_dict())
+            for ref, snapshot in items
+        ]
+        if len(objs) != 0:
+            leancloud.Object.save_all(objs)
+
     @classmethod
     def get(cls, ref: Reference, transaction=_NA):
         _doc_id = ref.last
@@ -74,6 +89,8 @@ class LeancloudSnapshot(Snapshot):
     TODO: apply to LeancloudDatabase class and other places
     """
 
+    __slots__ = ()
+
     @classmethod
     def from_cla_obj(self, cla_obj):
         snapshot = Snapshot(cla_obj.dump())
@@ -82,6 +99,8 @@ class LeancloudSnapshot(Snapshot):
 
 class LeancloudReference(Reference):
 
+    __slots__ = ()
+
     @classmethod
     def from_cla_obj(cls, cla_obj):
         ref = cls()/cla_obj._class_name/cla_obj.get('_doc_id', cla_obj.id)
@@ -1,3 +1,7 @@
+import bisect
+from collections import defaultdict
+from numbers import Number
+
 from onto.common import _NA
 from onto.database import Database, Reference, Snapshot, Listener
 from onto.query.query import Query
@@ -5,15 +9,226 @@ from onto.query.query import Query
 
 class MockReference(Reference):
 
+    __slots__ = ()
+
     def is_collection(self):
-        return len(self.params) % 2 == 1
+        return len(self._path) % 2 == 1
 
     @property
     def collection(self):
         return self.first
 
     def is_document(self):
-        return len(self.params) % 2 == 0
+        return len(self._path) % 2 == 0
+
+    def is_collection_group(self):
+        return self.first == "**" and len(self._path) == 2
+
+    @property
+    def parent_path(self) -> str:
+        return '/'.join(self._path[:-1])
+
+
+def _is_hashable(val):
+    try:
+        hash(val)
+    except TypeError:
+        return False
+    else:
+        return True
+
+
+def _type_order(val):
+    """ Values are only ordered against values of the same kind
+            (similar to Firestore). Returns None for values that are
+            not range-indexed.
+
+    :param val:
+    :return:
+    """
+    if isinstance(val, bool):
+        return 'boolean'
+    elif isinstance(val, Number):
+        return 'number'
+    elif isinstance(val, str):
+        return 'string'
+    elif isinstance(val, bytes):
+        return 'bytes'
+    elif hasattr(val, 'timestamp'):
+        return 'timestamp'
+    else:
+        return None
+
+
+def _eq_key(val):
+    """ Returns the key of val in hash indexes: values of different kinds
+            are not equal (True is not 1, as in Firestore), while numbers
+            compare by value (1 is 1.0)
+    """
+    kind = _type_order(val)
+    return (kind if kind is not None else type(val), val)
+
+
+class MockIndex:
+    """ Secondary index on one data key of a collection.
+
+    - equal: hash index of (kind, value) -> keys
+    - ordered: sorted lists of (value, key), one per kind of value
+    - elements: hash index of array element -> keys (for array_contains)
+    """
+
+    def __init__(self):
+        self.equal = defaultdict(set)
+        self.unhashable = dict()
+        self.ordered = defaultdict(list)
+        self.elements = defaultdict(set)
+
+    def add(self, key, val):
+        if _is_hashable(val):
+            self.equal[_eq_key(val)].add(key)
+        else:
+            self.unhashable[key] = val
+
+        kind = _type_order(val)
+        if kind is not None:
+            bisect.insort(self.ordered[kind], (val, key))
+
+        if isinstance(val, list):
+            for elem in val:
+                if _is_hashable(elem):
+                    self.elements[_eq_key(elem)].add(key)
+
+    def remove(self, key, val):
+        if _is_hashable(val):
+            eq_key = _eq_key(val)
+            self.equal[eq_key].discard(key)
+            if len(self.equal[eq_key]) == 0:
+                del self.equal[eq_key]
+        else:
+            del self.unhashable[key]
+
+        kind = _type_order(val)
+        if kind is not None:
+            ordered = self.ordered[kind]
+            idx = bisect.bisect_left(ordered, (val, key))
+            del ordered[idx]
+
+        if isinstance(val, list):
+            for elem in val:
+                if not _is_hashable(elem):
+                    continue
+                eq_key = _eq_key(elem)
+                if eq_key in self.elements:
+                    self.elements[eq_key].discard(key)
+                    if len(self.elements[eq_key]) == 0:
+                        del self.elements[eq_key]
+
+    def eq(self, val) -> set:
+        if _is_hashable(val):
+            return set(self.equal.get(_eq_key(val), ()))
+        else:
+            return {key for key, other in self.unhashable.items()
+                    if other == val}
+
+    def _range(self, val, lo_incl, hi_incl, lo, hi):
+        kind = _type_order(val)
+        if kind is None:
+            return set()
+        ordered = self.ordered.get(kind, [])
+
+        if lo is None:
+            start = 0
+        elif lo_incl:
+            start = bisect.bisect_left(ordered, (lo,))
+        else:
+            start = bisect.bisect_right(ordered, (lo, chr(0x10ffff)))
+
+        if hi is None:
+            end = len(ordered)
+        elif hi_incl:
+            end = bisect.bisect_right(ordered, (hi, chr(0x10ffff)))
+        else:
+            end = bisect.bisect_left(ordered, (hi,))
+
+        return {key for _, key in ordered[start:end]}
+
+    def lt(self, val):
+        return self._range(val, lo_incl=True, hi_incl=False, lo=None, hi=val)
+
+    def le(self, val):
+        return self._range(val, lo_incl=True, hi_incl=True, lo=None, hi=val)
+
+    def gt(self, val):
+        return self._range(val, lo_incl=False, hi_incl=True, lo=val, hi=None)
+
+    def ge(self, val):
+        return self._range(val, lo_incl=True, hi_incl=True, lo=val, hi=None)
+
+    def contains(self, val):
+        if not _is_hashable(val):
+            return set()
+        return set(self.elements.get(_eq_key(val), ()))
+
+    def _in(self, vals):
+        res = set()
+        for val in vals:
+            res |= self.eq(val)
+        return res
+
+
+class MockCollection:
+    """ Documents of one collection, with secondary indexes built on
+            first use of a data key in a query.
+    """
+
+    def __init__(self):
+        self.docs = dict()
+        self.indexes = dict()
+
+    def set(self, key, d):
+        if key in self.docs:
+            self._unindex(key, self.docs[key])
+        self.docs[key] = d
+        for data_key, index in self.indexes.items():
+            if data_key in d:
+                index.add(key, d[data_key])
+
+    def delete(self, key):
+        d = self.docs.pop(key)
+        self._unindex(key, d)
+
+    def _unindex(self, key, d):
+        for data_key, index in self.indexes.items():
+            if data_key in d:
+                index.remove(key, d[data_key])
+
+    def index_of(self, data_key) -> MockIndex:
+        if data_key not in self.indexes:
+            index = MockIndex()
+            for key, d in self.docs.items():
+                if data_key in d:
+                    index.add(key, d[data_key])
+            self.indexes[data_key] = index
+        return self.indexes[data_key]
+
+    def select(self, conditions) -> list:
+        """ Returns keys of documents that meet all conditions
+
+        :param conditions: list of (data_key, condition, val)
+        :return:
+        """
+        if len(conditions) == 0:
+            return list(self.docs.keys())
+
+        res = None
+        for data_key, condition, val in conditions:
+            index = self.index_of(data_key)
+            f = getattr(index, MockDatabase._CONDITION_TO_INDEX_OP[condition])
+            keys = f(val)
+            res = keys if res is None else res & keys
+            if len(res) == 0:
+                break
+        return sorted(res)
 
 
 class MockDatabase(Database):
@@ -22,18 +237,65 @@ class MockDatabase(Database):
     def listener(cls):
         return MockListener
 
+    class Comparators(Database.Comparators):
+
+        eq = '=='
+        gt = '>'
+        ge = '>='
+        lt = '<'
+        le = '<='
+        contains = 'array_contains'
+        _in = 'in'
+
+    _CONDITION_TO_INDEX_OP = {
+        '==': 'eq',
+        '>': 'gt',
+        '>=': 'ge',
+        '<': 'lt',
+        '<=': 'le',
+        'array_contains': 'contains',
+        'in': '_in',
+    }
+
     d = dict()
 
+    _collections = defaultdict(MockCollection)
+
     ref = MockReference()
 
+    @classmethod
+    def _set_data(cls, ref: Reference, d):
+        key = str(ref)
+        cls.d[key] = d
+        cls._collections[ref.parent_path].set(key, d)
+
     @classmethod
     def set(cls, ref: Reference, snapshot: Snapshot, transaction=_NA):
-        cls.d[str(ref)] = snapshot.to_dict()
+        cls._set_data(ref, snapshot.to_dict())
         cls.listener()._pub(reference=ref, snapshot=snapshot)
 
+    @classmethod
+    def set_many(cls, items: [(Reference, Snapshot)], transaction=_NA):
+        items = list(items)
+        for ref, snapshot in items:
+            cls._set_data(ref, snapshot.to_dict())
+        for ref, snapshot in items:
+            cls.listener()._pub(reference=ref, snapshot=snapshot)
+
     @classmethod
     def get(cls, ref: Reference, transaction=_NA):
-        return cls.d[str(ref)]
+        """ Returns the document as a Snapshot, which is empty with
+                exists=False if the document does not exist
+        """
+        d = cls.d.get(str(ref), None)
+        if d is None:
+            return Snapshot(__onto_meta__=dict(exists=False))
+        return Snapshot(d, __onto_meta__=dict(exists=True))
+
+    @classmethod
+    def get_many(cls, refs: [Reference], transaction=_NA):
+        for ref in refs:
+            yield ref, cls.get(ref=ref, transaction=transaction)
 
     update = set
     create = set
@@ -46,7 +308,26 @@ class MockDatabase(Database):
         :param transaction:
         :return:
         """
-        del cls.d[str(ref)]
+        key = str(ref)
+        del cls.d[key]
+        cls._collections[ref.parent_path].delete(key)
+
+    @classmethod
+    def _collections_of(cls, ref: MockReference):
+        if ref.is_collection_group():
+            return [col for path, col in cls._collections.items()
+                    if path.split('/')[-1] == ref.last]
+        else:
+            # Reading does not create an empty collection
+            col = cls._collections.get(str(ref), None)
+            return [] if col is None else [col]
+
+    @classmethod
+    def query(cls, q: Query):
+        ref, conditions = q._to_mock_query()
+        for col in cls._collections_of(ref):
+            for key in col.select(conditions):
+                yield MockReference.from_str(key), Snapshot(col.docs[key])
 
 
 class MockListener(Listener):
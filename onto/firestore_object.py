@@ -67,7 +67,7 @@ class FirestoreObjectMixin:
         # if not snapshot.exists:
         #     return None
 
-        obj = cls.from_dict(d=snapshot.to_dict(), doc_ref=ref, **kwargs)
+        obj = cls.from_dict(d=snapshot.view(), doc_ref=ref, **kwargs)
         return obj
 
     def to_snapshot(self):
@@ -287,14 +287,19 @@ class FirestoreObjectValMixin:
 
     @classmethod
     def _import_from_dict(cls, d, transaction=None, _store=_NA, **kwargs):
+        refresh = False
         if _store is _NA:
+            _store = CTX.gallery_var.get()
+            # The active gallery reads later without this transaction
+            refresh = transaction is not None
+        if _store is None:
             from onto.store import Gallery
             _store = Gallery()
-            res = cls._import_val(d, transaction=transaction, _store=_store, **kwargs)
+            refresh = True
+        res = cls._import_val(d, transaction=transaction, _store=_store,
+                              **kwargs)
+        if refresh:
             _store.refresh(transaction=transaction)
-        else:
-            res = cls._import_val(d, transaction=transaction, _store=_store,
-                                  **kwargs)
         res['_store'] = _store
         return res
 
@@ -62,6 +62,20 @@ class PrimaryObject(FirestoreObject, QueryMixin, CollectionMixin,
     def _query_schema(cls):
         return _collect_query_schema(cls)()
 
+    @classmethod
+    def _query_translator(cls):
+        """ Returns the compiled query translator of the class. The
+                translator is rebuilt only after a new subclass registers.
+        """
+        cache = cls._get_cache(cls.__name__)
+        if 'query_translator' not in cache:
+            from onto.query.query import QueryTranslator
+            cache['query_translator'] = QueryTranslator.from_schema_obj(
+                cls._query_schema(),
+                obj_type_condition=cls.get_obj_type_condition()
+            )
+        return cache['query_translator']
+
     # @classmethod
     # def get_schema_cls(cls):
     #     """ Returns schema_cls or the union of all schemas of subclasses.
@@ -133,6 +133,46 @@ class ViewModelQuery(QueryBase):
         return cur_where
 
 
+class QueryTranslator:
+    """
+    Maps attribute names in query arguments to data keys and comparators
+        to conditions, and appends the obj_type condition. Compiled once
+        from the query schema of a PrimaryObject class
+        (see PrimaryObject._query_translator).
+    """
+
+    def __init__(self, data_keys: dict, obj_type_condition=None):
+        self.data_keys = data_keys
+        self.obj_type_condition = obj_type_condition
+
+    @classmethod
+    def from_schema_obj(cls, schema_obj, obj_type_condition=None):
+        return cls(
+            data_keys={
+                key: field.data_key
+                for key, field in schema_obj.fields.items()
+            },
+            obj_type_condition=obj_type_condition
+        )
+
+    @staticmethod
+    def condition_of(comparator):
+        return comparator if isinstance(comparator, str) \
+            else comparator.condition
+
+    def translate(self, arguments):
+        """ Yields (data_key, condition, val) for each argument
+
+        :param arguments: list of (key, comparator, val)
+        """
+        if self.obj_type_condition is not None:
+            arguments = [*arguments, self.obj_type_condition]
+        for key, comparator, val in arguments:
+            # TODO: NOTE: data_key will always be translated
+            # TODO: translate val
+            yield self.data_keys[key], self.condition_of(comparator), val
+
+
 class DomainModelQuery(QueryBase):
 
     # def get_query(self):
@@ -174,39 +214,30 @@ class DomainModelQuery(QueryBase):
         else:
             cur_where = db._doc_ref_from_ref(self.ref)
         # cur_where = firestore.Query(parent=q)
-        condition = self.parent.get_obj_type_condition()
-        if condition is not None:
-            arguments = self.arguments + [condition]
-        else:
-            arguments = self.arguments.copy()
-        for (key, comparator, val) in arguments:
-            # TODO: NOTE: data_key will always be translated
-            data_key = self.parent._query_schema().fields[key].data_key
-            condition = comparator if isinstance(comparator, str) else comparator.condition
-            # TODO: translate val
+        translator = self.parent._query_translator()
+        for data_key, condition, val in translator.translate(self.arguments):
             cur_where = cur_where.where(data_key, condition, val)
         return cur_where
 
+    def _to_mock_query(self):
+        """ Returns the collection reference and a list of
+                (data_key, condition, val) for MockDatabase.query
+        """
+        translator = self.parent._query_translator()
+        return self.ref, list(translator.translate(self.arguments))
+
     def _to_leancloud_query(self):
         from onto.database.leancloud import LeancloudDatabase
 
         # db: LeancloudDatabase = CTX.dbs.leancloud  # TODO: read db elsewhere
 
-        condition = self.parent.get_obj_type_condition()
-
-        if condition is not None:
-            arguments = self.arguments + [condition]
-        else:
-            arguments = self.arguments.copy()
-
         cla_str = self.ref.last
         import leancloud
         cla = leancloud.Object.extend(name=cla_str)
         q = cla.query
 
-        for key, comparator, val in arguments:
-            data_key = self.parent._query_schema().fields[key].data_key
-            func_name = comparator.condition
+        translator = self.parent._query_translator()
+        for data_key, func_name, val in translator.translate(self.arguments):
             f = getattr(q, func_name)
             f(data_key, val)
 
@@ -18,6 +18,11 @@ class ModelRegistry(type):
     _REGISTRY = {}
     _tree = defaultdict(set)
     _tree_r = defaultdict(set)
+    _caches = defaultdict(dict)
+    """
+    Values derived from the subclasses of a class (eg. query translator). 
+    Keyed by class name; cleared when a new subclass registers. 
+    """
 
     def __new__(mcs, name, bases, attrs):
         new_cls = type.__new__(mcs, name, bases, attrs)
@@ -33,8 +38,16 @@ class ModelRegistry(type):
                 mcs._tree[base.__name__].add(new_cls.__name__)
                 mcs._tree_r[new_cls.__name__].add(base.__name__)
 
+        for ancestor in new_cls.__mro__[1:]:
+            if isinstance(ancestor, ModelRegistry):
+                mcs._caches.pop(ancestor.__name__, None)
+
         return new_cls
 
+    @classmethod
+    def _get_cache(mcs, cls_name) -> dict:
+        return mcs._caches[cls_name]
+
     @classmethod
     def get_registry(mcs):
         return dict(mcs._REGISTRY)
@@ -7,6 +7,14 @@ class FirestoreSink(Sink):
     def emit(self, reference, snapshot):
         CTX.db.set(ref=reference, snapshot=snapshot)
 
+    def emit_many(self, items):
+        """ Writes (reference, snapshot) pairs in one batch
+
+        :param items:
+        :return:
+        """
+        CTX.db.set_many(items)
+
 
 class ViewModelSink(Sink):
 
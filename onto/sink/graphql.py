@@ -1,3 +1,6 @@
+import functools
+import inspect
+import threading
 import weakref
 from collections import defaultdict, OrderedDict
 from inspect import Parameter
@@ -7,6 +10,7 @@ from onto.source.protocol import Protocol
 from onto.view_model import ViewModel
 
 from onto.sink.base import Sink
+from onto.sink.pubsub import PubSubHub
 
 
 from collections import namedtuple
@@ -15,6 +19,31 @@ graph_schema = namedtuple('graph_schema', ['op_type', 'name', 'graphql_object_ty
 import graphql
 
 
+_galleries = weakref.WeakKeyDictionary()
+
+
+def _gallery_of(info):
+    """ Returns the Gallery of the GraphQL request of info, so that
+            relationships of every object resolved in the request are
+            read in batches and read once.
+    """
+    from onto.store import Gallery
+    context = info.context
+    if isinstance(context, dict):
+        if '_onto_gallery' not in context:
+            context['_onto_gallery'] = Gallery()
+        return context['_onto_gallery']
+    try:
+        gallery = _galleries.get(context, None)
+        if gallery is None:
+            gallery = Gallery()
+            _galleries[context] = gallery
+        return gallery
+    except TypeError:
+        # context is None or cannot be weakly referenced
+        return Gallery()
+
+
 class GraphQLSink(Sink):
 
     _protocol_cls = Protocol
@@ -49,13 +78,6 @@ class GraphQLSink(Sink):
     def mediator_instance(self):
         return self.parent()()
 
-    def _maybe_deserialize(self, val, annotated_type):
-        from onto.models.base import BaseRegisteredModel
-        if issubclass(annotated_type, BaseRegisteredModel):
-            return annotated_type.from_dict_special(val)
-        else:
-            return val
-
     def _f_of_rule(self, func_name):
         fname = self.protocol.fname_of(func_name)
         if fname is None:
@@ -66,20 +88,43 @@ class GraphQLSink(Sink):
         f = getattr(self.mediator_instance, fname)
         return f
 
-    def _invoke_mediator(self, *args, func_name, **kwargs):
+    def _compile_invoker(self, func_name):
+        """ Returns a callable that invokes the handler of func_name with
+                arguments annotated as a model deserialized from dict.
+                Resolves the handler and reads its signature only once.
+        """
+        from onto.models.base import BaseRegisteredModel
         f = self._f_of_rule(func_name=func_name)
-
-        annotation_d = {
-            k: v
-            for k, v in self._parameters_for(f)
+        decoders = {
+            name: annotated_type.from_dict_special
+            for name, annotated_type in self._parameters_for(f)
+            if isinstance(annotated_type, type)
+            and issubclass(annotated_type, BaseRegisteredModel)
         }
+        if len(decoders) == 0:
+            return f
 
-        new_kwargs = {
-            k:self._maybe_deserialize(val=v, annotated_type=annotation_d[k])
-            for k, v in kwargs.items()
-        }
+        def invoke(*args, **kwargs):
+            for name, decode in decoders.items():
+                if name in kwargs:
+                    kwargs[name] = decode(kwargs[name])
+            return f(*args, **kwargs)
+
+        return invoke
 
-        return f(*args, **new_kwargs)
+    _rules = ()
+    """ func_name of handlers to compile in start """
+
+    def _compile_invokers(self):
+        for func_name in self._rules:
+            self._invokers[func_name] = self._compile_invoker(func_name)
+
+    def _invoke_mediator(self, *args, func_name, **kwargs):
+        invoker = self._invokers.get(func_name, None)
+        if invoker is None:
+            invoker = self._compile_invoker(func_name)
+            self._invokers[func_name] = invoker
+        return invoker(*args, **kwargs)
 
     def __init__(self, view_model_cls: Type[ViewModel], camelize=True, many=False):
         """
@@ -91,14 +136,24 @@ class GraphQLSink(Sink):
         self.view_model_cls = view_model_cls
         import asyncio
         loop = asyncio.get_event_loop()
-        from functools import partial
-        cons = partial(asyncio.Queue, loop=loop)
-        self.qs = defaultdict(cons)
         self.loop = loop
         self._camelize = camelize
         self.many = many
+        self._invokers = dict()
         super().__init__()
 
+    @staticmethod
+    async def publish_kafka(topic_name, value, key=None):
+        """ Publishes a message with the process-wide producer
+                (see Context.kafka_producer_pool); returns once the message
+                is added to a batch.
+
+        :return: future of the delivery
+        """
+        from onto.context import Context as CTX
+        return await CTX.kafka_producer_pool().send(
+            topic=topic_name, value=value, key=key)
+
     def _param_to_graphql_arg(self, annotated_type):
         from onto.models.utils import _graphql_type_from_py
         from graphql import GraphQLArgument, GraphQLInputObjectType
@@ -156,6 +211,7 @@ class GraphQLSink(Sink):
 
 
     def start(self):
+        self._compile_invokers()
         subscription_schema = self._as_graphql_schema()
         return subscription_schema
 
@@ -164,21 +220,55 @@ class GraphQLSubscriptionSink(GraphQLSink):
 
     op_type = 'Subscription'
 
+    _rules = ('add_topic', 'on_event')
+
+    def __init__(self, *args, maxsize=16, overflow=PubSubHub.COALESCE,
+                 **kwargs):
+        """
+
+        :param maxsize: number of pending events for each subscriber;
+            0 for unbounded
+        :param overflow: what a subscriber that falls behind misses
+            (see PubSubHub)
+        """
+        super().__init__(*args, **kwargs)
+        self.hub = PubSubHub(maxsize=maxsize, overflow=overflow)
+
+    def publish(self, topic_name, event, key=None) -> int:
+        """ Converts event with on_event once, and delivers the result to
+                every subscriber of the topic. Call from self.loop
+                (see publish_threadsafe).
+
+        :param key: for overflow 'coalesce', a subscriber that falls behind
+            only receives the latest event of each key
+        :return: number of subscribers
+        """
+        if self.hub.n_subscribers(topic_name) == 0:
+            return 0
+        from onto.store import Gallery
+        with Gallery().activate():
+            payload = {
+                self.sink_name:
+                    self._invoke_mediator(func_name='on_event', event=event)
+            }
+        return self.hub.publish(topic_name, payload, key=key)
+
+    def publish_threadsafe(self, topic_name, event, key=None):
+        self.loop.call_soon_threadsafe(
+            functools.partial(self.publish, topic_name, event, key=key))
+
     def _register_op(self):
         from gql import subscribe
         async def f(parent, info, **kwargs):
             # Register topic
             topic_name = self._invoke_mediator(func_name='add_topic', **kwargs)
             # Listen to topic
-            q = self.qs[topic_name]
-
-            while True:
-                event = await q.get()
-                yield {
-                    self.sink_name:
-                        self._invoke_mediator(func_name='on_event',
-                                              event=event)
-                }
+            sub = self.hub.subscribe(topic_name)
+            try:
+                async for payload in sub:
+                    yield payload
+            finally:
+                sub.close()
 
         # name = self.parent().__name__
         # f.__name__ = name
@@ -194,11 +284,14 @@ class GraphQLQuerySink(GraphQLSink):
 
     op_type = 'Query'
 
+    _rules = ('query',)
+
     def _register_op(self):
         from gql import query
 
         async def f(parent, info, **kwargs):
-            res = self._invoke_mediator(func_name='query', **kwargs)
+            with _gallery_of(info).activate():
+                res = self._invoke_mediator(func_name='query', **kwargs)
             return res
 
         name = self.sink_name
@@ -212,11 +305,14 @@ class GraphQLMutationSink(GraphQLSink):
 
     op_type = 'Mutation'
 
+    _rules = ('mutate',)
+
     def _register_op(self):
         from gql import mutate
 
         async def f(parent, info, **kwargs):
-            res = self._invoke_mediator(func_name='mutate', **kwargs)
+            with _gallery_of(info).activate():
+                res = self._invoke_mediator(func_name='mutate', **kwargs)
             return res
 
         name = self.sink_name
@@ -241,6 +337,241 @@ def op_schema(op_type, schema_all):
     return ot
 
 
+class DocumentCache:
+    """ LRU cache of parsed and validated documents of a schema, so that
+            an operation is parsed and validated once and not on every
+            request. Clients may send the id of a persisted query
+            (see persist) instead of its text.
+
+    Example:
+        schema = GraphQLSchema(query=op_schema('Query', schema_all), ...)
+        documents = DocumentCache(schema)
+        result = await documents.execute(query, variables=variables)
+    """
+
+    def __init__(self, schema, maxsize=1024, persisted=None,
+                 register_persisted=True):
+        """
+
+        :param schema: GraphQLSchema
+        :param maxsize: maximum number of cached documents
+        :param persisted: dict of persisted query id to query text
+        :param register_persisted: whether a request that sends both a
+            query and its id persists the query (automatic persisted
+            queries); the id must be the sha256 hex digest of the query
+        """
+        self.schema = schema
+        self.maxsize = maxsize
+        self.persisted = dict(persisted or dict())
+        self.register_persisted = register_persisted
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+        self.n_hits = 0
+        self.n_misses = 0
+
+    @staticmethod
+    def query_id_of(query: str) -> str:
+        import hashlib
+        return hashlib.sha256(query.encode(encoding='utf-8')).hexdigest()
+
+    def persist(self, query: str) -> str:
+        """ Persists query and returns its id """
+        query_id = self.query_id_of(query)
+        self.persisted[query_id] = query
+        return query_id
+
+    def _query_of(self, query, query_id):
+        if query_id is None:
+            return query
+        elif query is None:
+            return self.persisted.get(query_id, None)
+        elif self.register_persisted \
+                and self.query_id_of(query) == query_id:
+            self.persisted[query_id] = query
+            return query
+        else:
+            return None
+
+    def _parse_and_validate(self, query):
+        try:
+            document = graphql.parse(query)
+        except graphql.GraphQLError as error:
+            return None, [error]
+        return document, graphql.validate(self.schema, document)
+
+    def get(self, query=None, query_id=None):
+        """ Returns (document, errors) of the query; errors of invalid
+                queries are cached as well.
+
+        :param query: text of the query
+        :param query_id: id of a persisted query
+        """
+        query = self._query_of(query, query_id)
+        if query is None:
+            return None, [graphql.GraphQLError('PersistedQueryNotFound')]
+        with self._lock:
+            res = self._documents.get(query, None)
+            if res is not None:
+                self._documents.move_to_end(query)
+                self.n_hits += 1
+                return res
+            self.n_misses += 1
+        res = self._parse_and_validate(query)
+        with self._lock:
+            self._documents[query] = res
+            if len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+        return res
+
+    async def execute(self, query=None, variables=None, operation_name=None,
+                      context_value=None, root_value=None, query_id=None):
+        """ Executes a query or mutation with the cached document
+
+        :return: ExecutionResult
+        """
+        document, errors = self.get(query=query, query_id=query_id)
+        if len(errors) != 0:
+            return graphql.ExecutionResult(data=None, errors=errors)
+        result = graphql.execute(
+            self.schema, document,
+            root_value=root_value,
+            context_value=context_value,
+            variable_values=variables,
+            operation_name=operation_name
+        )
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def subscribe(self, query=None, variables=None, operation_name=None,
+                        context_value=None, root_value=None, query_id=None):
+        """ Subscribes with the cached document
+
+        :return: async iterator of ExecutionResult, or ExecutionResult
+            with errors
+        """
+        document, errors = self.get(query=query, query_id=query_id)
+        if len(errors) != 0:
+            return graphql.ExecutionResult(data=None, errors=errors)
+        result = graphql.subscribe(
+            self.schema, document,
+            root_value=root_value,
+            context_value=context_value,
+            variable_values=variables,
+            operation_name=operation_name
+        )
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+
+class CachedGraphQL:
+    """ ASGI app that executes queries and mutations sent as JSON with
+            HTTP POST through a DocumentCache, and passes other requests
+            (lifespan, GET, subscriptions over websocket) on to app.
+            A persisted query is sent as its id in
+            extensions.persistedQuery.sha256Hash.
+
+    Example:
+        app = graphql_app(schema)
+    """
+
+    def __init__(self, app, documents: DocumentCache, context=None):
+        """
+
+        :param app: ASGI app to pass other requests on to
+        :param documents: cache of the schema served by app
+        :param context: function of (scope, receive) that returns the
+            context_value of a query; defaults to {'request': Request}
+            with a starlette Request, as the stargql app does
+        """
+        self.app = app
+        self.documents = documents
+        if context is not None:
+            self._context = context
+
+    @staticmethod
+    def _context(scope, receive):
+        from starlette.requests import Request
+        return {'request': Request(scope, receive=receive)}
+
+    @staticmethod
+    def _is_json_post(scope) -> bool:
+        if scope['type'] != 'http' or scope['method'] != 'POST':
+            return False
+        content_type = dict(scope.get('headers', ())).get(
+            b'content-type', b'')
+        return content_type.split(b';')[0].strip() == b'application/json'
+
+    @staticmethod
+    async def _respond(send, status, body: dict):
+        import json
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json')],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': json.dumps(body).encode(encoding='utf-8'),
+        })
+
+    async def __call__(self, scope, receive, send):
+        if not self._is_json_post(scope):
+            return await self.app(scope, receive, send)
+        import json
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+        async def replay():
+            # the body is read already; resolvers may read it again
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return await self._respond(
+                send, 400, {'errors': [{'message': 'Invalid JSON body'}]})
+        persisted = (data.get('extensions', None) or dict()).get(
+            'persistedQuery', None) or dict()
+        result = await self.documents.execute(
+            query=data.get('query', None),
+            query_id=persisted.get('sha256Hash', None),
+            variables=data.get('variables', None),
+            operation_name=data.get('operationName', None),
+            context_value=self._context(scope, replay),
+        )
+        response = {'data': result.data}
+        if result.errors:
+            response['errors'] = [error.formatted for error in result.errors]
+        status = 400 if result.data is None and result.errors else 200
+        await self._respond(send, status, response)
+
+
+def graphql_app(schema, maxsize=1024, persisted=None, **kwargs):
+    """ Returns the stargql app of schema, with queries and mutations
+            parsed and validated through a DocumentCache
+
+    :param schema: GraphQLSchema
+    :param maxsize: see DocumentCache
+    :param persisted: see DocumentCache
+    :param kwargs: keyword arguments for stargql.GraphQL, for example:
+        on_startup, on_shutdown
+    """
+    from stargql import GraphQL
+    return CachedGraphQL(
+        app=GraphQL(schema=schema, **kwargs),
+        documents=DocumentCache(
+            schema, maxsize=maxsize, persisted=persisted),
+    )
+
+
 query = GraphQLQuerySink
 mutation = GraphQLMutationSink
 subscription = GraphQLSubscriptionSink
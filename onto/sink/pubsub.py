@@ -0,0 +1,141 @@
+import itertools
+from collections import OrderedDict
+
+
+class Subscription:
+    """ Buffer of events of a topic for one subscriber; iterate with
+            `async for` until closed.
+
+    When the buffer is full, the oldest pending event is dropped. With
+        overflow COALESCE, an event published with the key of a pending
+        event replaces the pending event instead (latest value per key).
+    """
+
+    __slots__ = ('hub', 'topic', 'maxsize', 'overflow', 'closed',
+                 'n_dropped', 'n_coalesced', '_buffer', '_seq', '_waiter')
+
+    def __init__(self, hub, topic, maxsize, overflow):
+        self.hub = hub
+        self.topic = topic
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.closed = False
+        self.n_dropped = 0
+        self.n_coalesced = 0
+        self._buffer = OrderedDict()
+        self._seq = itertools.count()
+        self._waiter = None
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def _push(self, event, key=None):
+        if key is not None and self.overflow == PubSubHub.COALESCE:
+            buffer_key = (True, key)
+            if buffer_key in self._buffer:
+                self._buffer[buffer_key] = event
+                self.n_coalesced += 1
+                return
+        else:
+            buffer_key = (False, next(self._seq))
+        if self.maxsize != 0 and len(self._buffer) >= self.maxsize:
+            self._buffer.popitem(last=False)
+            self.n_dropped += 1
+        self._buffer[buffer_key] = event
+        self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def get(self):
+        """ Returns the oldest pending event; waits if there is none
+
+        :raises StopAsyncIteration: when closed
+        """
+        while len(self._buffer) == 0:
+            if self.closed:
+                raise StopAsyncIteration
+            import asyncio
+            self._waiter = asyncio.get_event_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        _, event = self._buffer.popitem(last=False)
+        return event
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+    def close(self):
+        """ Unsubscribes; pending events can still be read """
+        if not self.closed:
+            self.closed = True
+            self.hub._unsubscribe(self)
+            self._wake()
+
+
+class PubSubHub:
+    """ Delivers each event published to a topic to every subscription of
+            the topic. Events are shared, not copied, between
+            subscriptions. Not thread-safe: call from the event loop of the
+            subscribers.
+    """
+
+    DROP_OLDEST = 'drop_oldest'
+    COALESCE = 'coalesce'
+
+    def __init__(self, maxsize=16, overflow=COALESCE):
+        """
+
+        :param maxsize: default number of pending events per subscription;
+            0 for unbounded
+        :param overflow: default overflow policy, one of:
+            'drop_oldest': drops the oldest pending event when full;
+            'coalesce': replaces the pending event that has the same key,
+                and otherwise drops the oldest pending event when full
+        """
+        if overflow not in (self.DROP_OLDEST, self.COALESCE):
+            raise ValueError(f'Unknown overflow policy: {overflow}')
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self._topics = dict()
+
+    def subscribe(self, topic, maxsize=None, overflow=None) -> Subscription:
+        sub = Subscription(
+            hub=self,
+            topic=topic,
+            maxsize=maxsize if maxsize is not None else self.maxsize,
+            overflow=overflow if overflow is not None else self.overflow,
+        )
+        # dict as an insertion-ordered set
+        self._topics.setdefault(topic, dict())[sub] = None
+        return sub
+
+    def _unsubscribe(self, sub):
+        subs = self._topics.get(sub.topic, None)
+        if subs is not None:
+            subs.pop(sub, None)
+            if len(subs) == 0:
+                del self._topics[sub.topic]
+
+    def n_subscribers(self, topic) -> int:
+        return len(self._topics.get(topic, ()))
+
+    def publish(self, topic, event, key=None) -> int:
+        """ Adds event to the buffer of every subscription of topic
+
+        :param key: identifies the entity that event is the latest value
+            of, for overflow policy COALESCE
+        :return: number of subscriptions the event is delivered to
+        """
+        subs = self._topics.get(topic, None)
+        if subs is None:
+            return 0
+        for sub in subs:
+            sub._push(event, key=key)
+        return len(subs)
@@ -47,7 +47,7 @@ class Source(SourceBase):
                 f" for {self.mediator_instance.__class__.__name__}"
             )
         f = getattr(self.mediator_instance, fname)
-        f(*args, **kwargs)
+        return f(*args, **kwargs)
 
     async def _invoke_mediator_async(self, *args, func_name, **kwargs):
         fname = self.protocol.fname_of(func_name)
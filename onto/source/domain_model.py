@@ -24,7 +24,8 @@ class DomainModelSource(FirestoreSource):
 
     def _call(self, container):
         with container.lock:
-            for func_name, ref, snapshot in self.delta(container):
+            for func_name, ref, snapshot in self.delta(
+                    container, latest_only=self._latest_only()):
                 obj = self.domain_model_cls.from_snapshot(
                     ref=ref, snapshot=snapshot)
                 self._invoke_mediator(func_name=func_name, obj=obj)
@@ -34,7 +35,8 @@ class DomainModelTransactionalSource(DomainModelSource):
 
     def _call(self, container):
         with container.lock:
-            for func_name, ref, snapshot in self.delta(container):
+            for func_name, ref, snapshot in self.delta(
+                    container, latest_only=self._latest_only()):
                 self._operation(func_name=func_name, ref=ref, snapshot=snapshot)
 
     def _operation(self, func_name, ref, snapshot):
@@ -13,6 +13,19 @@ class FirestoreSource(Source):
         super().__init__()
         self.query = query
 
+    checkpoint_name = None
+    """
+    Identifies the checkpoint of the source across restarts (see
+        FirestoreListener.resume_token_store); defaults to the path of
+        the source in its mediator class
+    """
+
+    def __set_name__(self, owner, name):
+        super().__set_name__(owner, name)
+        if self.checkpoint_name is None:
+            self.checkpoint_name = \
+                f'{owner.__module__}.{owner.__qualname__}.{name}'
+
     def start(self):
         self._register()
 
@@ -20,26 +33,69 @@ class FirestoreSource(Source):
         from onto.context import Context as CTX
         CTX.db.listener().register(query=self.query, source=self)
 
+    latest_only = None
+    """
+    If set to True, only the latest version of each document in a read
+        window is delivered. None (default) follows the listener: True
+        when its coordinator coalesces callbacks (see Coordinator.COALESCE),
+        since a coalesced read window holds every version since the last
+        callback.
+    """
+
+    _coalesced = False
+    """ Set by the listener on register """
+
+    def _latest_only(self) -> bool:
+        if self.latest_only is not None:
+            return self.latest_only
+        return self._coalesced
+
     @classmethod
-    def delta(cls, container):
-        start = container._read_times[-2]
-        end = container._read_times[-1]
-        for key in container.d.keys():
-            for snapshot in container.get_with_range(key, start, end):
-                from onto.database import Snapshot
-                prev: Snapshot = snapshot.prev
-                cur: Snapshot = snapshot
-                if not prev.exists:
-                    yield ("on_create", key, cur)
-                elif prev.exists and cur.exists:
-                    yield ("on_update", key, cur)
-                elif prev.exists and not cur.exists:
-                    yield ("on_delete", key, cur)
-                else:
-                    raise ValueError
+    def delta(cls, container, latest_only=False):
+        """ Yields changes in the read window of the container, and
+                compacts the container once the window is consumed.
+
+        :param container:
+        :param latest_only: yields one change for each document,
+            from the version before the window to the latest version
+        :return:
+        """
+        start, end = container.read_window()
+        for key in container.changed_keys():
+            snapshots = container.get_with_range(key, start, end)
+            if latest_only:
+                snapshots = list(snapshots)
+                if len(snapshots) == 0:
+                    continue
+                prev, cur = snapshots[0].prev, snapshots[-1]
+                if prev.exists is False and not cur.exists:
+                    # Created and deleted within the window
+                    continue
+                yield (cls._func_name(prev, cur), key, cur)
+            else:
+                for snapshot in snapshots:
+                    yield (cls._func_name(snapshot.prev, snapshot),
+                           key, snapshot)
+        container.compact()
+
+    @staticmethod
+    def _func_name(prev, cur):
+        """
+
+        :param prev: prev.exists is None if the state is unknown
+        :param cur:
+        :return:
+        """
+        if cur.exists:
+            return "on_update" if prev.exists else "on_create"
+        elif prev.exists is not False:
+            return "on_delete"
+        else:
+            raise ValueError
 
     def _call(self, container):
         with container.lock:
-            for func_name, ref, snapshot in self.delta(container):
+            for func_name, ref, snapshot in self.delta(
+                    container, latest_only=self._latest_only()):
                 self._invoke_mediator(
                     func_name=func_name, ref=ref, snapshot=snapshot)
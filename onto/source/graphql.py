@@ -92,7 +92,7 @@ class GraphQLSource(Source):
 
     def start(self):
         schema = _as_graphql_root_schema(self.attributed_cls)
-        from stargql import GraphQL
+        from onto.sink.graphql import graphql_app
 
         async def on_startup():
             from asyncio.queues import Queue
@@ -102,7 +102,7 @@ class GraphQLSource(Source):
         async def shutdown():
             pass
 
-        app = GraphQL(
+        app = graphql_app(
             schema=schema,
             on_startup=[on_startup],
             on_shutdown=[shutdown]
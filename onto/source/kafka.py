@@ -1,12 +1,30 @@
+import inspect
+import logging
+
 from onto.source.base import Source
 
+_LOGGER = logging.getLogger(__name__)
+
+
+def _consumer_config(**consumer_config) -> dict:
+    """ Returns settings for AIOKafkaConsumer. bootstrap_servers defaults
+            to KafkaDatabase.bootstrap_servers (see Context) and then to
+            localhost.
+    """
+    if 'bootstrap_servers' not in consumer_config:
+        from onto.database.kafka import KafkaDatabase
+        bootstrap_servers = KafkaDatabase.bootstrap_servers
+        consumer_config['bootstrap_servers'] = \
+            bootstrap_servers if bootstrap_servers is not None \
+            else 'localhost:9092'
+    return consumer_config
+
 
-async def _kafka_subscribe(topic_name, callback):
+async def _kafka_subscribe(topic_name, callback, **consumer_config):
     from aiokafka import AIOKafkaConsumer
     consumer = AIOKafkaConsumer(
         topic_name,
-        bootstrap_servers='10.10.8.140:9092',
-        # group_id="my-group"
+        **_consumer_config(**consumer_config)
     )
     # Get cluster layout and join group `my-group`
     await consumer.start()
@@ -26,17 +44,280 @@ async def _kafka_subscribe(topic_name, callback):
         await consumer.stop()
 
 
+async def _kafka_subscribe_batch(
+        topic_name, callback, max_records, timeout_ms, **consumer_config):
+    """ Consumes messages in batches of up to max_records. Offsets are
+            committed after callback returns, so that a batch is consumed
+            again if callback fails (at-least-once delivery). Committing
+            requires group_id in consumer_config.
+
+    :param callback: invoked as callback(messages=...) and awaited if it
+        returns an awaitable
+    """
+    from aiokafka import AIOKafkaConsumer
+    consumer_config = _consumer_config(**consumer_config)
+    consumer = AIOKafkaConsumer(
+        topic_name,
+        enable_auto_commit=False,
+        **consumer_config
+    )
+    await consumer.start()
+    try:
+        while True:
+            batches = await consumer.getmany(
+                timeout_ms=timeout_ms, max_records=max_records)
+            messages = [msg for msgs in batches.values() for msg in msgs]
+            if len(messages) == 0:
+                continue
+            res = callback(messages=messages)
+            if inspect.isawaitable(res):
+                await res
+            if consumer_config.get('group_id', None) is not None:
+                await consumer.commit()
+    except Exception as e:
+        import warnings
+        warnings.warn(f'Error: {e}')
+        raise ValueError('Interrupted') from e
+    finally:
+        # Will leave consumer group; offsets of a failed batch are not
+        #   committed
+        await consumer.stop()
+
+
+class _PartitionWorkers:
+    """ Runs one worker task per assigned partition: messages of a
+            partition are handled in order, and partitions are handled
+            concurrently. Offsets are committed only for messages whose
+            handler has returned.
+
+    A partition is paused when max_pending polled batches wait for its
+        worker, and resumed when its worker catches up, so that a slow
+        partition does not buffer without limit.
+    """
+
+    def __init__(self, consumer, callback, max_pending=4):
+        """
+
+        :param consumer: AIOKafkaConsumer
+        :param callback: invoked as callback(message=...) in the default
+            executor, so that a blocking handler does not block the event
+            loop; awaited if it returns an awaitable
+        :param max_pending: polled batches of a partition to queue before
+            pausing the partition
+        """
+        self.consumer = consumer
+        self.callback = callback
+        self.max_pending = max_pending
+        self.qs = dict()
+        self.tasks = dict()
+        self.offsets = dict()
+        self.paused = set()
+        self.error = None
+
+    async def _invoke(self, **kwargs):
+        import asyncio
+        import functools
+        res = await asyncio.get_event_loop().run_in_executor(
+            None, functools.partial(self.callback, **kwargs))
+        if inspect.isawaitable(res):
+            await res
+
+    async def _work(self, tp, q):
+        import asyncio
+        while True:
+            messages = await q.get()
+            try:
+                if self.error is None:
+                    for message in messages:
+                        await self._invoke(message=message)
+                    self.offsets[tp] = messages[-1].offset + 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Stops committing; messages from this batch on are
+                #   consumed again by the next owner of the partition
+                self.error = e
+            finally:
+                q.task_done()
+                if tp in self.paused and not q.full():
+                    self.paused.discard(tp)
+                    self.consumer.resume(tp)
+
+    def put(self, tp, messages):
+        import asyncio
+        if tp not in self.qs:
+            q = asyncio.Queue(maxsize=self.max_pending)
+            self.qs[tp] = q
+            self.tasks[tp] = asyncio.ensure_future(self._work(tp, q))
+        q = self.qs[tp]
+        # Does not overflow: a full partition is paused, and getmany
+        #   returns no messages of paused partitions
+        q.put_nowait(messages)
+        if q.full():
+            self.paused.add(tp)
+            self.consumer.pause(tp)
+
+    async def commit(self, tps=None):
+        offsets = {tp: offset for tp, offset in self.offsets.items()
+                   if tps is None or tp in tps}
+        if len(offsets) != 0:
+            await self.consumer.commit(offsets)
+        for tp in offsets:
+            del self.offsets[tp]
+
+    async def drain(self, tps=None):
+        """ Waits for messages of partitions (default: all) to be handled,
+                stops their workers, and commits their offsets
+        """
+        tps = list(self.qs) if tps is None else [
+            tp for tp in tps if tp in self.qs]
+        for tp in tps:
+            await self.qs[tp].join()
+            self.tasks.pop(tp).cancel()
+            del self.qs[tp]
+            self.paused.discard(tp)
+        await self.commit(tps)
+
+
+def _rebalance_listener(workers: _PartitionWorkers):
+    from aiokafka.abc import ConsumerRebalanceListener
+
+    class _Listener(ConsumerRebalanceListener):
+
+        async def on_partitions_revoked(self, revoked):
+            # Commits before the partitions are assigned to another worker
+            await workers.drain(revoked)
+
+        async def on_partitions_assigned(self, assigned):
+            pass
+
+    return _Listener()
+
+
+async def _kafka_subscribe_partitioned(
+        topic_name, callback, max_records, timeout_ms, max_pending,
+        **consumer_config):
+    """ Consumes messages as a member of the consumer group group_id, with
+            one worker task for each assigned partition. Before
+            partitions are revoked in a rebalance, in-flight messages are
+            handled and their offsets committed.
+    """
+    from aiokafka import AIOKafkaConsumer
+    consumer = AIOKafkaConsumer(
+        enable_auto_commit=False,
+        **_consumer_config(**consumer_config)
+    )
+    workers = _PartitionWorkers(
+        consumer, callback=callback, max_pending=max_pending)
+    consumer.subscribe(
+        topics=[topic_name], listener=_rebalance_listener(workers))
+    await consumer.start()
+    try:
+        while workers.error is None:
+            batches = await consumer.getmany(
+                timeout_ms=timeout_ms, max_records=max_records)
+            for tp, messages in batches.items():
+                if len(messages) != 0:
+                    workers.put(tp, messages)
+            await workers.commit()
+        raise workers.error
+    except Exception as e:
+        import warnings
+        warnings.warn(f'Error: {e}')
+        raise ValueError('Interrupted') from e
+    finally:
+        await workers.drain()
+        await consumer.stop()
+
+
 class KafkaSource(Source):
 
-    def __init__(self, topic_name):
+    def __init__(self, topic_name, batch=False, max_records=500,
+                 timeout_ms=1000, group_id=None, max_pending=4, codec=None,
+                 **consumer_config):
         """ Initializes a ViewMediator to declare protocols that
                 are called when the results of a query change. Note that
                 mediator.start must be called later.
 
-        :param query: a listener will be attached to this query
+        :param topic_name:
+        :param batch: if True, on_topic_batch is invoked with a list of
+            messages instead of on_topic with each message
+        :param max_records: maximum number of messages in a batch
+        :param timeout_ms: maximum time to wait for a batch
+        :param group_id: consumer group to join; workers with the same
+            group_id share the partitions of the topic, and offsets are
+            committed after messages are handled. Unless batch, each
+            partition assigned to this worker is handled by its own task,
+            and synchronous on_topic handlers run in the default executor.
+        :param max_pending: with group_id and not batch, polled batches of
+            a partition to queue before pausing the partition
+        :param codec: codec (or codec id) for messages without the codec
+            header (see decode). Without codec, only messages with the
+            codec header are decoded; others are passed as consumed.
+            Messages are not decoded when consumer_config has
+            value_deserializer, and messages that cannot be decoded are
+            logged and skipped.
+        :param consumer_config: keyword arguments for AIOKafkaConsumer,
+            for example: bootstrap_servers, group_id, value_deserializer
         """
         super().__init__()
         self.topic_name = topic_name
+        self.batch = batch
+        self.max_records = max_records
+        self.timeout_ms = timeout_ms
+        self.group_id = group_id
+        self.max_pending = max_pending
+        self.codec = codec
+        self.consumer_config = consumer_config
+
+    def decode(self, message):
+        """ Returns the message value as a KafkaSnapshot. Messages carry
+                the id of their codec in the headers.
+        """
+        from onto.database.kafka import KafkaSnapshot
+        return KafkaSnapshot.from_message(message, codec=self.codec)
+
+    def _should_decode(self, message) -> bool:
+        """ Decodes when a codec is configured or the message names its
+                codec, and not when the consumer has a value_deserializer
+        """
+        from onto.codec import CODEC_HEADER
+        if 'value_deserializer' in self.consumer_config:
+            return False
+        if self.codec is not None:
+            return True
+        return any(key == CODEC_HEADER for key, _ in message.headers or ())
+
+    def _decoded(self, message):
+        """ Returns the ConsumerRecord with its value decoded (see decode),
+                the record as is if it is not to be decoded, or None if
+                it cannot be decoded
+        """
+        if not self._should_decode(message):
+            return message
+        import dataclasses
+        try:
+            return dataclasses.replace(message, value=self.decode(message))
+        except Exception:
+            _LOGGER.exception(
+                f"Skipping undecodable message {message.topic} "
+                f"{message.partition}:{message.offset}")
+            return None
+
+    def _invoke_decoded(self, func_name, message=None, messages=None):
+        if messages is not None:
+            messages = [
+                decoded for decoded in map(self._decoded, messages)
+                if decoded is not None
+            ]
+            if len(messages) == 0:
+                return None
+            return self._invoke_mediator(
+                func_name=func_name, messages=messages)
+        message = self._decoded(message)
+        if message is None:
+            return None
+        return self._invoke_mediator(func_name=func_name, message=message)
 
     def start(self, loop):
         import asyncio
@@ -47,5 +328,31 @@ class KafkaSource(Source):
 
     async def _register(self):
         from functools import partial
-        f = partial(self._invoke_mediator, func_name='on_topic')
-        await _kafka_subscribe(topic_name=self.topic_name, callback=f)
+        if self.batch:
+            f = partial(self._invoke_decoded, func_name='on_topic_batch')
+            await _kafka_subscribe_batch(
+                topic_name=self.topic_name,
+                callback=f,
+                max_records=self.max_records,
+                timeout_ms=self.timeout_ms,
+                group_id=self.group_id,
+                **self.consumer_config
+            )
+        elif self.group_id is not None:
+            f = partial(self._invoke_decoded, func_name='on_topic')
+            await _kafka_subscribe_partitioned(
+                topic_name=self.topic_name,
+                callback=f,
+                max_records=self.max_records,
+                timeout_ms=self.timeout_ms,
+                max_pending=self.max_pending,
+                group_id=self.group_id,
+                **self.consumer_config
+            )
+        else:
+            f = partial(self._invoke_decoded, func_name='on_topic')
+            await _kafka_subscribe(
+                topic_name=self.topic_name,
+                callback=f,
+                **self.consumer_config
+            )
@@ -19,8 +19,10 @@ class ViewModelSource(FirestoreSource):
         super().__init__(query=query)
 
     def _call(self, container):
-        for change_type_str, ref, snapshot in self.delta(container):
-            obj = self.view_model_cls.from_snapshot(
-                ref=ref, snapshot=snapshot)
-            self._invoke_mediator(func_name=change_type_str, obj=obj)
+        with container.lock:
+            for func_name, ref, snapshot in self.delta(
+                    container, latest_only=self._latest_only()):
+                obj = self.view_model_cls.from_snapshot(
+                    ref=ref, snapshot=snapshot)
+                self._invoke_mediator(func_name=func_name, obj=obj)
 
@@ -4,4 +4,5 @@ from .store import Store
 from .gallery import Gallery
 from .struct import struct_ref
 from .snapshot_container import SnapshotContainer
+from .resume_token_store import ResumeTokenStore, SqliteResumeTokenStore
 from .business_property_store import to_ref
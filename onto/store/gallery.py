@@ -1,12 +1,21 @@
-from typing import List
+import contextlib
+from typing import List, Optional
 from onto.database import Reference, Snapshot, Database
 from onto.store.snapshot_container import SnapshotContainer
 from onto.context import Context as CTX
 
 
 class Gallery:
+    """ Collects references of relationships to read them with one
+            Database.get_many, and caches the objects read.
 
-    def __init__(self, database=None):
+    Objects imported while a gallery is active (see activate) share the
+        gallery: their nested relationships are read together the first
+        time any of them is accessed, and read once for the rest of the
+        request.
+    """
+
+    def __init__(self, database=None, transaction=None):
         self.tasks = dict()  # TODO: Watch out for when (doc_ref, obj_type_super) and (doc_ref, obj_type_sub) are both in the set; the objects will be equivalent, but initialized twice under the current plan
         self.visited = set()
         self.container = SnapshotContainer()
@@ -15,6 +24,22 @@ class Gallery:
         if database is None:
             database = CTX.db
         self._database = database
+        self.transaction = transaction
+
+    @contextlib.contextmanager
+    def activate(self):
+        """ Makes this gallery the store of objects imported in the block
+                (see FirestoreObjectValMixin._import_from_dict)
+        """
+        token = CTX.gallery_var.set(self)
+        try:
+            yield self
+        finally:
+            CTX.gallery_var.reset(token)
+
+    @staticmethod
+    def current() -> Optional['Gallery']:
+        return CTX.gallery_var.get()
 
     def _datastore(self):
         return self._database
@@ -41,10 +66,19 @@ class Gallery:
             pass
 
     def save(self):
+        """ Writes objects scheduled with save_later. Objects sharing a
+                transaction are written with one Database.set_many call.
+
+        :return:
+        """
+        from collections import defaultdict
+        writes = defaultdict(list)
         for _, (obj, kwargs) in self.save_tasks.items():
             d = obj._export_as_dict(**kwargs)
             snapshot = Snapshot(d)
-            self._datastore().set(snapshot=snapshot, ref=obj.doc_ref, transaction=kwargs['transaction'])
+            writes[kwargs['transaction']].append((obj.doc_ref, snapshot))
+        for transaction, items in writes.items():
+            self._datastore().set_many(items, transaction=transaction)
 
     @staticmethod
     def _get_snapshots_with_listener(refs: List[Reference]):
@@ -101,6 +135,9 @@ class Gallery:
                 self.object_container[ref] = instance
 
     def retrieve(self, *, doc_ref, obj_type):
+        if doc_ref in self.tasks:
+            # Reads every pending reference at once
+            self.refresh(transaction=self.transaction)
         if doc_ref not in self.object_container:
             snapshot = self.container.get(key=doc_ref)
             self.object_container[doc_ref] = obj_type.from_snapshot(ref=doc_ref, snapshot=snapshot)
@@ -0,0 +1,79 @@
+import threading
+from typing import Optional, Tuple
+
+
+class ResumeTokenStore:
+    """
+    Stores a checkpoint (resume token and read time) for each watch
+        target, so that a listener resumes from where it left off after
+        a restart instead of receiving every document again.
+
+    This class keeps checkpoints in memory; subclass to persist them
+        (see SqliteResumeTokenStore).
+    """
+
+    def __init__(self):
+        self._d = dict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, tuple]]:
+        """ Returns (resume_token, read_time) of the target, or None
+
+        :param key: identifies the target (see FirestoreListener._target_key)
+        """
+        with self.lock:
+            return self._d.get(key, None)
+
+    def set(self, key: str, resume_token: bytes, read_time: tuple) -> None:
+        with self.lock:
+            self._d[key] = (resume_token, read_time)
+
+    def delete(self, key: str) -> None:
+        with self.lock:
+            self._d.pop(key, None)
+
+
+class SqliteResumeTokenStore(ResumeTokenStore):
+    """
+    Persists checkpoints to a SQLite database file.
+
+    Example:
+        FirestoreListener.resume_token_store = \
+            SqliteResumeTokenStore(path='resume_tokens.db')
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        import sqlite3
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS resume_tokens ('
+                'key TEXT PRIMARY KEY, resume_token BLOB, '
+                'seconds REAL, nanos REAL)'
+            )
+
+    def get(self, key):
+        with self.lock:
+            row = self._conn.execute(
+                'SELECT resume_token, seconds, nanos FROM resume_tokens '
+                'WHERE key = ?', (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        resume_token, seconds, nanos = row
+        return resume_token, (seconds, nanos)
+
+    def set(self, key, resume_token, read_time):
+        seconds, nanos = read_time
+        with self.lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO resume_tokens '
+                '(key, resume_token, seconds, nanos) VALUES (?, ?, ?, ?)',
+                (key, resume_token, seconds, nanos)
+            )
+
+    def delete(self, key):
+        with self.lock, self._conn:
+            self._conn.execute(
+                'DELETE FROM resume_tokens WHERE key = ?', (key,))
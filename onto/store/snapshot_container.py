@@ -13,11 +13,132 @@ class SnapshotContainer:
 
     """
 
-    def __init__(self):
+    def __init__(self, max_versions=None, max_age=None):
+        """
+
+        :param max_versions: maximum number of versions to retain for
+            each key (the latest version of a key is always retained)
+        :param max_age: versions with timestamp older than the latest
+            read time minus max_age (in seconds) are not retained
+        """
         self.d = defaultdict(list)
         self.store = dict()
         self.lock = threading.Lock()
         self._read_times = [(-inf, -inf)]
+        self.max_versions = max_versions
+        self.max_age = max_age
+        # Keys set since the latest read time, and keys set in the
+        #   read window that is not consumed yet (dicts are used as
+        #   ordered sets)
+        self._changed = dict()
+        self._window = dict()
+        # Keys whose latest version is of a document that does not exist
+        self._deleted = set()
+        # Keys to check in the next compact besides the read window:
+        #   deletions retained until they are older than max_age
+        self._expiring = dict()
+        # Invoked as checkpoint(resume_token, read_time) once a read
+        #   window with a resume token is consumed (see compact)
+        self.checkpoint = None
+        self._resume_token = None
+
+    def add_read_time(self, read_time: tuple, resume_token=None) -> None:
+        """ Extends the read window to read_time
+
+        :param read_time:
+        :param resume_token: resume token of the watch stream at read_time
+        """
+        self._read_times.append(read_time)
+        if resume_token is not None:
+            self._resume_token = resume_token
+        self._window.update(self._changed)
+        self._changed = dict()
+
+    def read_window(self) -> tuple:
+        """ Returns (start, end) of the read window that is not consumed
+                yet, where start is exclusive and end is inclusive.
+                The window spans all read times since the last compact,
+                so that no change is missed when a consumer falls behind.
+        """
+        return self._read_times[0], self._read_times[-1]
+
+    def changed_keys(self):
+        """ Returns keys set in the read window
+        """
+        return self._window.keys()
+
+    @property
+    def size(self) -> int:
+        """ Number of versions currently stored
+        """
+        return len(self.store)
+
+    def _n_expired(self, timestamps, horizon) -> int:
+        """ Returns the number of versions at the front of timestamps
+                that are no longer retained. Only versions at or before
+                horizon (ie. consumed by a read window) may expire.
+        """
+        n = 0
+        if self.max_versions is not None:
+            n = max(n, len(timestamps) - self.max_versions)
+        if self.max_age is not None:
+            seconds, nanos = horizon
+            n = max(n, bisect.bisect_left(
+                timestamps, (seconds - self.max_age, nanos)))
+        return min(n, bisect.bisect_right(timestamps, horizon))
+
+    def compact(self) -> None:
+        """ Removes versions not retained according to max_versions and
+                max_age, and read times that are no longer needed for
+                the read window. Call after the read window is consumed;
+                the next window starts at the end of this one.
+        """
+        horizon = self._read_times[-1]
+        del self._read_times[:-1]
+
+        # Only keys set in the read window may have versions beyond
+        #   max_versions; retained deletions are checked until forgotten
+        keys = dict.fromkeys(self._window)
+        keys.update(self._expiring)
+        self._expiring = dict()
+        for key in keys:
+            timestamps = self.d.get(key, None)
+            if timestamps is None:
+                continue
+            n = self._n_expired(timestamps, horizon)
+            if key in self._deleted:
+                # A deletion is forgotten once consumed, unless max_age
+                #   retains it
+                if self.max_age is None and self.max_versions is not None \
+                        and timestamps[-1] <= horizon:
+                    n = len(timestamps)
+            elif n == len(timestamps) != 0:
+                # The latest version is only forgotten when the
+                #   document no longer exists
+                n -= 1
+            for ts in timestamps[:n]:
+                self._unlink(self.store.pop((ts, key)))
+            del timestamps[:n]
+            if len(timestamps) == 0:
+                del self.d[key]
+                self._deleted.discard(key)
+            elif key in self._deleted:
+                self._expiring[key] = None
+        self._window = dict()
+
+        if self.checkpoint is not None and self._resume_token is not None:
+            resume_token, self._resume_token = self._resume_token, None
+            self.checkpoint(resume_token, horizon)
+
+    @staticmethod
+    def _unlink(val):
+        """ Removes references between versions so that versions
+                removed from the container are not kept alive by
+                the versions after them.
+        """
+        if hasattr(val, 'prev'):
+            val.prev = None
+            val.next = None
 
     # def get(self, key):
     #     return self.store[key]
@@ -26,8 +147,7 @@ class SnapshotContainer:
     #     self.store[key] = val
 
     def set_with_timestamp(self, key: str, val, timestamp: tuple=None) -> None:
-        self.store[(timestamp, key)] = val
-        self.d[key].append(timestamp)
+        self.set(key=key, val=val, timestamp=timestamp)
         # Since the timestamps for all TimeMap.set operations
         #   are strictly increasing
         # self.d[key].sort()
@@ -35,12 +155,17 @@ class SnapshotContainer:
     def set(self, key: str, val, timestamp: tuple=None) -> None:
         self.store[(timestamp, key)] = val
         self.d[key].append(timestamp)
+        self._changed[key] = None
+        if getattr(val, 'exists', True) is False:
+            self._deleted.add(key)
+        else:
+            self._deleted.discard(key)
         # Since the timestamps for all TimeMap.set operations
         #   are strictly increasing
         # self.d[key].sort()
 
     def has_previous(self, key: str):
-        return len(self.d[key]) != 0
+        return len(self.d.get(key, ())) != 0
 
     def previous(self, key):
         ts = self.d[key][-1]
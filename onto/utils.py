@@ -74,7 +74,7 @@ def snapshot_to_obj(
     # if not snapshot.exists:
     #     return None
 
-    d = snapshot.to_dict()
+    d = snapshot.view()
     obj_cls = super_cls
 
     if "obj_type" in d:
@@ -2,7 +2,7 @@ import functools
 from abc import abstractmethod
 
 import typing
-from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
+from aiokafka import AIOKafkaConsumer
 
 from . import Mediator
 from .. import view_model
@@ -82,11 +82,8 @@ async def _kafka_subscribe(topic_name):
 
 
 async def _kafka_publish(topic_name, value):
-    producer = AIOKafkaProducer(
-        bootstrap_servers='localhost:9092',
-        # group_id="my-group"
-    )
-    await producer.send(topic=topic_name, value=value)
+    from onto.context import Context as CTX
+    await CTX.kafka_producer_pool().send(topic=topic_name, value=value)
 
 
 # class TaskManagementMixin:
@@ -209,8 +206,8 @@ class GraphQLMediator(Mediator):
         async def shutdown():
             pass
 
-        from stargql import GraphQL
-        app = GraphQL(
+        from onto.sink.graphql import graphql_app
+        app = graphql_app(
             schema=cls._get_graphql_schema(),
             on_startup=[on_startup],
             on_shutdown=[shutdown]
@@ -45,7 +45,7 @@ import functools
 
 import pytz
 
-from google.api_core.bidi import ResumableBidiRpc
+from google.api_core.bidi import ResumableBidiRpc, BidiRpc
 from google.api_core.bidi import BackgroundConsumer
 from google.cloud.firestore_v1.proto import firestore_pb2
 from google.cloud.firestore_v1 import _helpers
@@ -98,21 +98,28 @@ DocTreeEntry = collections.namedtuple("DocTreeEntry", ["value", "index"])
 
 class WatchDocTree(object):
     # TODO: this class has been modified to suit the purpose of flask-boiler
-    # TODO: note that the RAM usage will keep increasing since consumed
-    #           document snapshot in _removed are not deleted
-    #           so that we can find the original version of the document
-    #           when a document is changed.
+    # NOTE: removed documents are kept in _removed so that we can find the
+    #           original version of the document when a document is changed.
+    #           _removed is bounded: the least recently removed documents
+    #           are forgotten first (see HISTORY_SIZE). _Watch.push does not
+    #           fill the tree; see _Watch.doc_tree.
 
-    def __init__(self):
+    HISTORY_SIZE = 1024
+
+    def __init__(self, history_size=None):
         self._dict = {}
         self._index = 0
-        self._removed = {}
+        self._removed = collections.OrderedDict()
+        self._history_size = self.HISTORY_SIZE \
+            if history_size is None else history_size
 
     def keys(self):
-        return [*self._removed.keys(), *self._dict.keys()]
+        """ Returns an iterator over documents in the tree
+        """
+        return iter(self._dict)
 
     def _copy(self):
-        wdt = WatchDocTree()
+        wdt = WatchDocTree(history_size=self._history_size)
         wdt._dict = self._dict.copy()
         wdt._index = self._index
         wdt._removed = self._removed.copy()
@@ -122,16 +129,25 @@ class WatchDocTree(object):
     def insert(self, key, value):
         self = self._copy()
         self._dict[key] = DocTreeEntry(value, self._index)
+        self._removed.pop(key, None)
         self._index += 1
         return self
 
     def find(self, key):
         return self._dict[key]
 
+    def find_removed(self, key):
+        """ Returns the entry of a removed document, or None if the
+                document is not in the history
+        """
+        return self._removed.get(key, None)
+
     def remove(self, key):
         self = self._copy()
-        self._removed[key] = self._dict[key]
-        del self._dict[key]
+        self._removed[key] = self._dict.pop(key)
+        self._removed.move_to_end(key)
+        while len(self._removed) > self._history_size:
+            self._removed.popitem(last=False)
         return self
 
     def __iter__(self):
@@ -197,10 +213,31 @@ def _should_terminate(exception):
     return isinstance(wrapped, _TERMINATING_STREAM_EXCEPTIONS)
 
 
+class _WatchRpc(ResumableBidiRpc):
+    """ Invokes on_open each time the stream is opened, including when
+            the stream is re-opened after a recoverable error.
+    """
+
+    def __init__(self, *args, on_open=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._on_open = on_open
+
+    def open(self):
+        super().open()
+        if self._on_open is not None:
+            self._on_open()
+
+    def _send_now(self, request):
+        """ Sends without recovery (for use in on_open, where the
+                stream is being opened)
+        """
+        BidiRpc.send(self, request)
+
+
 class _Watch(object):
 
     BackgroundConsumer = BackgroundConsumer  # FBO unit tests
-    ResumableBidiRpc = ResumableBidiRpc  # FBO unit tests
+    ResumableBidiRpc = _WatchRpc  # FBO unit tests
 
     def __init__(
         self,
@@ -245,6 +282,11 @@ class _Watch(object):
         # self._snapshot_callback = snapshot_callback
         self._closing = threading.Lock()
         self._closed = False
+        # Set when the stream is open; see wait_until_ready
+        self._ready = threading.Event()
+        self._n_opened = 0
+        self._done_callbacks = list()
+        self._removed_callbacks = list()
 
         self.resume_token = None
 
@@ -259,6 +301,7 @@ class _Watch(object):
             should_terminate=_should_terminate,
             # initial_request=rpc_request,
             metadata=self._firestore._rpc_metadata,
+            on_open=self._on_rpc_open,
         )
 
         # TODO: recover this line somewhere
@@ -270,6 +313,10 @@ class _Watch(object):
         # Initialize state for on_snapshot
         # The sorted tree of QueryDocumentSnapshots as sent in the last
         # snapshot. We only look at the keys.
+        # NOTE: push forwards the change log of each target without
+        #   computing a snapshot, so doc_tree and doc_map stay empty; the
+        #   documents of a target are kept by its SnapshotContainer
+        #   (see FirestoreListener), whose history is bounded by compact.
         self.doc_tree = WatchDocTree()
 
         # A map of document names to QueryDocumentSnapshots for the last sent
@@ -311,12 +358,67 @@ class _Watch(object):
     #             database=self._firestore._database_string
     #         )
 
+    def _on_rpc_open(self):
+        """ Re-adds targets when the stream is re-opened, since targets
+                do not carry over to the new stream.
+        """
+        if self._n_opened != 0:
+            _LOGGER.info("Re-adding targets to re-opened stream.")
+            self.change_log.clear()
+            for target in list(self._targets.values()):
+                if self.resume_token is not None:
+                    # Only changes after the last push are sent again
+                    target = {**target, "resume_token": self.resume_token}
+                    target.pop("read_time", None)
+                self._rpc._send_now(
+                    firestore_pb2.ListenRequest(
+                        database=self._firestore._database_string,
+                        add_target=target
+                    )
+                )
+        self._n_opened += 1
+        self._ready.set()
+
+    def wait_until_ready(self, timeout=None):
+        """ Blocks until the stream is open.
+
+        :param timeout: seconds; None to wait indefinitely
+        :raises TimeoutError: when the stream is not open within timeout
+        """
+        if not self._ready.wait(timeout=timeout):
+            raise TimeoutError("Watch stream is not open")
+
+    def add_done_callback(self, callback):
+        """ Adds a callback invoked with the reason when the stream
+                terminates without recovery (not when closed
+                intentionally with close()).
+
+        :param callback:
+        :return:
+        """
+        self._done_callbacks.append(callback)
+
+    def add_target_removed_callback(self, callback):
+        """ Adds a callback invoked as callback(target_id, cause) when the
+                server removes a target with an error (for example, when
+                it rejects the resume token of the target); the target
+                is forgotten by the stream.
+
+        :param callback:
+        :return:
+        """
+        self._removed_callbacks.append(callback)
+
+    READY_TIMEOUT = 60
+
     def add_target(self, target, callback):
-        """ Only new targets can be added.
+        """ Only new targets can be added. Waits for the stream to open
+                (up to READY_TIMEOUT seconds).
 
         :param target:
         :return:
         """
+        self.wait_until_ready(timeout=self.READY_TIMEOUT)
         target_id = target['target_id']
         if target_id in self._targets:
             raise ValueError
@@ -329,6 +431,27 @@ class _Watch(object):
             )
         )
 
+    def remove_target(self, target_id):
+        """ Stops listening to a target added with add_target.
+
+        :param target_id:
+        :return:
+        """
+        if target_id not in self._targets:
+            raise ValueError
+        del self._targets[target_id]
+        del self._target_callbacks[target_id]
+        self._rpc.send(
+            firestore_pb2.ListenRequest(
+                database=self._firestore._database_string,
+                remove_target=target_id
+            )
+        )
+
+    @property
+    def n_targets(self) -> int:
+        return len(self._targets)
+
     @property
     def is_active(self):
         """bool: True if this manager is actively streaming.
@@ -360,9 +483,15 @@ class _Watch(object):
             self._rpc.close()
             self._rpc = None
             self._closed = True
+            self._ready.clear()
             _LOGGER.debug("Finished stopping manager.")
 
         if reason:
+            for callback in self._done_callbacks:
+                try:
+                    callback(reason)
+                except Exception:
+                    _LOGGER.exception("done callback of watch has failed")
             # Raise an exception if a reason is provided
             _LOGGER.debug("reason for closing: %s" % reason)
             if isinstance(reason, Exception):
@@ -475,19 +604,21 @@ class _Watch(object):
         #     raise RuntimeError("Unexpected target ID %s sent by server" % target_id)
 
     def _on_snapshot_target_change_remove(self, proto):
-        pass
-        # _LOGGER.debug("on_snapshot: target change: REMOVE")
-        # change = proto.target_change
-        #
-        # code = 13
-        # message = "internal error"
-        # if change.cause:
-        #     code = change.cause.code
-        #     message = change.cause.message
-        #
-        # message = "Error %s:  %s" % (code, message)
-        #
-        # raise RuntimeError(message)
+        _LOGGER.debug("on_snapshot: target change: REMOVE")
+        change = proto.target_change
+        if change.cause.code == 0:
+            # Removed as requested
+            return
+        for target_id in change.target_ids:
+            if self._targets.pop(target_id, None) is None:
+                continue
+            self._target_callbacks.pop(target_id, None)
+            self.change_log.pop(target_id, None)
+            for callback in self._removed_callbacks:
+                try:
+                    callback(target_id, change.cause)
+                except Exception:
+                    _LOGGER.exception("target removed callback has failed")
 
     def _on_snapshot_target_change_reset(self, proto):
         # Whatever changes have happened so far no longer matter.
@@ -614,7 +745,8 @@ class _Watch(object):
             if target_id not in self._target_callbacks:
                 continue
             callback = self._target_callbacks[target_id]
-            callback(target_id, changes, read_time)
+            callback(target_id, changes, read_time,
+                     resume_token=next_resume_token)
         self.has_pushed = True
         #
         # self.doc_tree = updated_tree
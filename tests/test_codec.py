@@ -0,0 +1,62 @@
+from collections import namedtuple
+
+import pytest
+
+Message = namedtuple('Message', ['value', 'headers'])
+
+
+@pytest.mark.parametrize('codec_id', ['json', 'msgpack'])
+def test_codec_roundtrip(codec_id):
+    from onto.codec import get_codec
+    codec = get_codec(codec_id)
+    d = {'a': 1, 'b': [1, 'two'], 'c': {'d': None}}
+    assert codec.decode(codec.encode(d)) == d
+
+
+def test_schema_codec():
+    from marshmallow import Schema, fields
+    from onto.codec import SchemaCodec, register_codec, codec_of, get_codec
+
+    class MeetingCodecSchema(Schema):
+        location = fields.Raw()
+        status = fields.Raw()
+        user_ids = fields.Raw(data_key='userIds')
+
+    codec = register_codec(SchemaCodec.from_schema(MeetingCodecSchema()))
+    assert codec.codec_id.startswith('schema:MeetingCodecSchema:')
+    assert codec.keys == ('location', 'status', 'userIds')
+    # Another version of the schema has another codec_id
+    reordered = SchemaCodec(
+        keys=('status', 'location', 'userIds'), name='MeetingCodecSchema')
+    assert reordered.codec_id != codec.codec_id
+
+    d = {'userIds': ['a', 'b'], 'location': 'l', 'extra': 1}
+    b = codec.encode(d)
+    assert codec.decode(b) == d
+    assert len(b) < len(get_codec('json').encode(d))
+
+    headers = [('onto-codec', codec.codec_id.encode())]
+    assert codec_of(headers) is codec
+    assert codec_of(None).codec_id == 'json'
+    assert codec_of(None, default='msgpack').codec_id == 'msgpack'
+
+    with pytest.raises(ValueError):
+        codec_of([('onto-codec', b'unknown')])
+
+
+def test_kafka_snapshot_from_message():
+    from onto.codec import get_codec
+    from onto.database.kafka import KafkaSnapshot
+
+    value = get_codec('msgpack').encode({'a': 1})
+    snapshot = KafkaSnapshot.from_message(
+        Message(value=value, headers=[('onto-codec', b'msgpack')]))
+    assert snapshot.to_dict() == {'a': 1}
+    assert snapshot.exists
+
+    snapshot = KafkaSnapshot.from_message(
+        Message(value=b'{"a": 2}', headers=[]))
+    assert snapshot.to_dict() == {'a': 2}
+
+    snapshot = KafkaSnapshot.from_message(Message(value=None, headers=[]))
+    assert snapshot.exists is False
@@ -0,0 +1,94 @@
+import time
+
+from onto.coordinator import Coordinator
+
+
+def _tasks(coordinator, res):
+    for key in ('a', 'b'):
+        for i in range(5):
+            def f(key=key, i=i):
+                time.sleep(0.001)
+                res.append((key, i))
+            coordinator._add_awaitable(f, key=key)
+    coordinator.join()
+
+
+def test_thread_workers_keep_key_order():
+    res = list()
+    _tasks(Coordinator(n_workers=4), res)
+    assert [i for key, i in res if key == 'a'] == list(range(5))
+    assert [i for key, i in res if key == 'b'] == list(range(5))
+
+
+def test_asyncio_workers():
+    res = list()
+    coordinator = Coordinator(n_workers=2, executor=Coordinator.ASYNCIO)
+
+    async def g():
+        res.append(('c', 0))
+
+    coordinator._add_awaitable(g, key='c')
+    _tasks(coordinator, res)
+    assert ('c', 0) in res
+    assert [i for key, i in res if key == 'b'] == list(range(5))
+
+
+def test_asyncio_sync_tasks_run_concurrently():
+    from threading import Barrier
+    res = list()
+    barrier = Barrier(2, timeout=5)
+    coordinator = Coordinator(n_workers=2, executor=Coordinator.ASYNCIO)
+    for key in (0, 1):  # one key per partition
+        coordinator._add_awaitable(
+            lambda key=key: res.append((key, barrier.wait())), key=key)
+    coordinator.join()
+    assert sorted(key for key, _ in res) == [0, 1]
+
+
+def test_coalesce():
+    from threading import Event
+    res = list()
+    started, release = Event(), Event()
+    coordinator = Coordinator(overflow=Coordinator.COALESCE)
+
+    def block():
+        started.set()
+        release.wait()
+
+    coordinator._add_awaitable(block, key='a')
+    started.wait()
+    for i in range(50):
+        coordinator._add_awaitable(lambda i=i: res.append(i), key='b')
+    assert coordinator.depth == 1
+    release.set()
+    coordinator.join()
+    assert res == [49]
+    assert coordinator.n_coalesced == 49
+
+
+def test_drop_oldest():
+    from threading import Event
+    res = list()
+    started, release = Event(), Event()
+    coordinator = Coordinator(maxsize=2, overflow=Coordinator.DROP_OLDEST)
+
+    def block():
+        started.set()
+        release.wait()
+
+    coordinator._add_awaitable(block)
+    started.wait()
+    for i in range(5):
+        coordinator._add_awaitable(lambda i=i: res.append(i))
+    release.set()
+    coordinator.join()
+    assert res == [3, 4]
+    assert coordinator.n_dropped == 3
+
+
+def test_unknown_executor():
+    import pytest
+    # Listener tasks close over containers with locks and mutate
+    #   mediator state, so they cannot run in another process
+    with pytest.raises(ValueError):
+        Coordinator(executor='process')
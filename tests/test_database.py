@@ -1,3 +1,4 @@
+import pytest
 from onto.database.firestore import TargetIdAssigner
 from onto.query.query import DomainModelQuery
 
@@ -77,6 +78,28 @@ def test_serialize():
     assert str(ab) == 'a/b'
 
 
+def test_reference_path():
+
+    from onto.database import Reference
+
+    r = Reference() / 'a' / 'b/c'
+    assert r.path == ('a', 'b', 'c')
+    assert r.first == 'a'
+    assert r.id == 'c'
+    assert hash(r) == hash('a/b/c')
+    assert {'a/b/c': 1}[r] == 1
+
+
+def test_reference_intern():
+
+    from onto.database.firestore import FirestoreReference
+
+    a = FirestoreReference.from_str('a/b', intern=True)
+    b = FirestoreReference.from_str('a/b', intern=True)
+    assert a is b
+    assert FirestoreReference.from_str('a/b') is not a
+
+
 def test_leancloud():
     from onto.database.leancloud import LeancloudDatabase
     from onto.database import Snapshot
@@ -96,6 +119,372 @@ def test_target_id_assigner():
     assert assigner.assign_id() == 35
 
 
+def test_watch_doc_tree_history():
+    from onto.watch import WatchDocTree
+    tree = WatchDocTree(history_size=2)
+    for key in 'abc':
+        tree = tree.insert(key, None)
+    for key in 'abc':
+        tree = tree.remove(key)
+    assert list(tree.keys()) == []
+    assert tree.find_removed('a') is None
+    assert tree.find_removed('c').index == 2
+
+    tree = tree.insert('c', None)
+    assert list(tree.keys()) == ['c']
+    assert tree.find_removed('c') is None
+
+
+def test_lazy_firestore_snapshot():
+    from google.cloud.firestore_v1 import _helpers
+    from google.cloud.firestore_v1.proto import document_pb2
+    from onto.database.firestore import LazyFirestoreSnapshot
+
+    document = document_pb2.Document(
+        fields=_helpers.encode_dict(dict(a=1, b='x', c=[1, 2])))
+    snapshot = LazyFirestoreSnapshot.from_fields_and_meta(
+        fields=document.fields, client=None, exists=True)
+    assert snapshot.exists
+    assert snapshot['b'] == 'x'
+    assert snapshot._data == {'b': 'x'}
+    assert 'c' in snapshot and 'd' not in snapshot
+    assert snapshot.get('d') is None
+    assert snapshot.to_dict() == dict(a=1, b='x', c=[1, 2])
+
+
+def test_process_proto_skips_unchanged():
+    from types import SimpleNamespace
+    from google.protobuf.timestamp_pb2 import Timestamp
+    from onto.database.firestore import FirestoreListener, \
+        FirestoreReference, FirestoreSnapshot
+    from onto.store import SnapshotContainer
+
+    container = SnapshotContainer()
+    ref = FirestoreReference.from_str('col/doc')
+    document = SimpleNamespace(update_time=Timestamp(seconds=1))
+    assert not FirestoreListener._is_unchanged(container, ref, document)
+
+    container.set(ref, FirestoreSnapshot.from_data_and_meta(
+        data=dict(), exists=True, update_time=Timestamp(seconds=1)), (1, 0))
+    assert FirestoreListener._is_unchanged(container, ref, document)
+    document.update_time = Timestamp(seconds=2)
+    assert not FirestoreListener._is_unchanged(container, ref, document)
+
+
+def test_listener_callback_bounded_queue():
+    import functools
+    import threading
+    import time
+    from types import SimpleNamespace
+    from onto.coordinator import Coordinator
+    from onto.database.firestore import FirestoreListener
+
+    coordinator = Coordinator(n_workers=1, maxsize=1, overflow='block')
+    handle = object()
+    container = FirestoreListener._containers[handle]
+    n_calls = list()
+
+    def _call(container):
+        with container.lock:
+            time.sleep(0.01)
+            n_calls.append(container)
+
+    def cb(container):
+        coordinator._add_awaitable(
+            functools.partial(_call, container), key=1)
+
+    def listen():
+        for i in range(5):
+            FirestoreListener.callback(
+                handle, 1, [], SimpleNamespace(seconds=i, nanos=0), cb=cb)
+
+    thread = threading.Thread(target=listen, daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    coordinator.join()
+    assert len(n_calls) == 5
+    del FirestoreListener._containers[handle]
+
+
+def test_watch_pool():
+    from onto.database.firestore import WatchPool
+
+    class FakeWatch:
+
+        def __init__(self):
+            self.targets = dict()
+            self.closed = False
+
+        def add_target(self, target, callback):
+            self.targets[target['target_id']] = callback
+
+        def remove_target(self, target_id):
+            del self.targets[target_id]
+
+        def close(self):
+            self.closed = True
+
+        def add_done_callback(self, callback):
+            self.done = callback
+
+    pool = WatchPool(watch_factory=FakeWatch, id_range=(32, 34))
+    pool.BACKOFF = 0
+    res = list()
+    handles = [
+        pool.add_target(dict(), lambda *args: res.append(args))
+        for _ in range(5)
+    ]
+    assert len(set(handles)) == 5
+    assert pool.n_watches == 3
+
+    last = pool._shards[-1].watch
+    last.targets[32](32, 'protos', 'read_time')
+    assert res == [(handles[-1], 32, 'protos', 'read_time')]
+
+    pool.remove_target(handles[-1])
+    assert last.closed
+    assert pool.n_watches == 2
+    pool.remove_target(handles[0])
+    pool.add_target(dict(), lambda *args: None)
+    assert pool.n_watches == 2
+    assert len(pool) == 4
+
+    # A stream that terminates is replaced, and its targets added again
+    shard = pool._shards[0]
+    terminated = shard.watch
+    terminated.done(RuntimeError())
+    assert shard.watch is not terminated
+    assert shard.watch.targets.keys() == terminated.targets.keys()
+
+    assert len(pool.close()) == 4
+    assert pool.n_watches == 0
+
+
+def test_watch_pool_failures():
+    from onto.database.firestore import WatchPool
+
+    class FakeWatch:
+
+        def __init__(self):
+            self.targets = dict()
+
+        def add_target(self, target, callback):
+            if fail_add:
+                raise TimeoutError()
+            self.targets[target['target_id']] = callback
+
+        def close(self):
+            pass
+
+        def add_done_callback(self, callback):
+            self.done = callback
+
+    errors = list()
+    pool = WatchPool(watch_factory=FakeWatch, id_range=(32, 34),
+                     on_error=lambda *args: errors.append(args))
+    pool.BACKOFF = 0
+
+    # A target that cannot be added is not registered
+    fail_add = True
+    with pytest.raises(TimeoutError):
+        pool.add_target(dict(), lambda *args: None)
+    assert len(pool) == 0
+    assert pool.n_watches == 0
+
+    fail_add = False
+    handle = pool.add_target(dict(), lambda *args: None)
+    shard = pool._shards[0]
+
+    # A stream that keeps terminating is given up after MAX_RETRIES
+    reason = RuntimeError('PermissionDenied')
+    for _ in range(pool.MAX_RETRIES):
+        shard.watch.done(reason)
+        assert pool.n_watches == 1
+    shard.watch.done(reason)
+    assert pool.n_watches == 0
+    assert len(pool) == 0
+    assert errors == [([handle], reason)]
+
+
+def test_watch_pool_resync():
+    from onto.database.firestore import WatchPool
+
+    class FakeWatch:
+
+        def __init__(self):
+            self.targets = dict()
+
+        def add_target(self, target, callback):
+            self.targets[target['target_id']] = target
+
+        def close(self):
+            pass
+
+        def add_target_removed_callback(self, callback):
+            self.removed = callback
+
+    errors, resyncs = list(), list()
+    pool = WatchPool(watch_factory=FakeWatch, id_range=(32, 34),
+                     on_error=lambda *args: errors.append(args),
+                     on_resync=resyncs.append)
+    resumed = pool.add_target(dict(resume_token=b'token'), lambda *args: None)
+    other = pool.add_target(dict(), lambda *args: None)
+    watch = pool._shards[0].watch
+
+    # A target removed for its resume token is added again without it
+    watch.removed(32, 'expired')
+    assert resyncs == [resumed]
+    assert watch.targets[32] == dict(target_id=32)
+    assert pool._shards[0].targets[32][0] == dict(target_id=32)
+
+    # Other removed targets are dropped
+    watch.removed(33, 'denied')
+    assert errors == [([other], 'denied')]
+    assert len(pool) == 1
+
+
+def test_watch_target_removed():
+    from google.cloud.firestore_v1.proto import firestore_pb2
+    from google.rpc import status_pb2
+
+    watch, calls = _fake_watch()
+    watch._rpc.open()
+    removed = list()
+    watch.add_target_removed_callback(
+        lambda *args: removed.append(args))
+    for target_id in (32, 33):
+        watch.add_target({'target_id': target_id}, callback=None)
+    TargetChange = firestore_pb2.TargetChange
+    watch.on_snapshot(firestore_pb2.ListenResponse(
+        target_change=TargetChange(
+            target_change_type=TargetChange.REMOVE, target_ids=[33])))
+    assert removed == [] and watch.n_targets == 2
+    cause = status_pb2.Status(code=3, message='invalid resume token')
+    watch.on_snapshot(firestore_pb2.ListenResponse(
+        target_change=TargetChange(
+            target_change_type=TargetChange.REMOVE, target_ids=[32],
+            cause=cause)))
+    assert removed == [(32, cause)]
+    assert watch.n_targets == 1
+    watch.close()
+
+
+def test_listener_checkpoint_names():
+    from types import SimpleNamespace
+    from unittest.mock import patch
+    from onto.database.firestore import FirestoreListener
+    from onto.store import ResumeTokenStore
+
+    store = ResumeTokenStore()
+    handles = iter(range(1000, 1003))
+    pool = SimpleNamespace(
+        add_target=lambda target, callback: next(handles),
+        remove_target=lambda handle: None,
+    )
+    target = {'documents': {'documents': ['c/d']}}
+    a = FirestoreListener._target_key(target, name='a')
+    b = FirestoreListener._target_key(target, name='b')
+    assert a != b
+    store.set(a, b'a', (1, 0))
+    store.set(b, b'b', (1, 0))
+    with patch.object(FirestoreListener, 'resume_token_store', store), \
+            patch.object(FirestoreListener, '_get_watches',
+                         return_value=pool):
+        h_a = FirestoreListener._add_target(target, cb=None, name='a')
+        h_b = FirestoreListener._add_target(target, cb=None, name='b')
+        # A checkpoint is used by one target at a time
+        h_c = FirestoreListener._add_target(target, cb=None, name='b')
+        assert h_c not in FirestoreListener._target_keys
+        FirestoreListener.release_target(h_c)
+        FirestoreListener.release_target(h_a)
+        assert store.get(a) is None and store.get(b) is not None
+        FirestoreListener._on_target_resync(h_b)
+        assert store.get(b) is None
+        FirestoreListener.release_target(h_b)
+
+
+def test_process_proto_skips_untracked_delete():
+    from types import SimpleNamespace
+    from unittest.mock import patch
+    from google.protobuf.timestamp_pb2 import Timestamp
+    from onto.context import Context as CTX
+    from onto.database.firestore import FirestoreListener
+    from onto.store import SnapshotContainer
+
+    container = SnapshotContainer()
+    proto = SimpleNamespace(
+        document_change='',
+        document_delete=SimpleNamespace(
+            document='col/doc', read_time=Timestamp(seconds=1)))
+    db = SimpleNamespace(firestore_client=SimpleNamespace(
+        _database_string='projects/p/databases/(default)'))
+    with patch.object(CTX, 'db', db, create=True):
+        FirestoreListener._process_proto(1, proto, container=container)
+    assert list(container.changed_keys()) == []
+
+
+def test_mock_set_many():
+    from onto.database.mock import MockDatabase
+    from onto.database import Snapshot
+
+    ref = MockDatabase.ref / 'setManyCol'
+    MockDatabase.set_many([
+        (ref / 'a', Snapshot(foo='a')),
+        (ref / 'b', Snapshot(foo='b')),
+    ])
+    assert MockDatabase.get(ref=ref / 'a') == {'foo': 'a'}
+    assert MockDatabase.get(ref=ref / 'b') == {'foo': 'b'}
+
+
+def test_firestore_sink_emit_many():
+    from onto.context import Context as CTX
+    from onto.database.mock import MockDatabase
+    from onto.database import Snapshot
+    from onto.sink.firestore import FirestoreSink
+    from unittest.mock import patch
+
+    ref = MockDatabase.ref / 'emitManyCol'
+    items = [(ref / 'a', Snapshot(foo='a')), (ref / 'b', Snapshot(foo='b'))]
+    with patch.object(CTX, 'db', MockDatabase), patch.object(
+            MockDatabase, 'set_many', wraps=MockDatabase.set_many) as set_many:
+        FirestoreSink().emit_many(items)
+    assert set_many.call_count == 1
+    assert MockDatabase.get(ref=ref / 'b') == {'foo': 'b'}
+
+
+def test_batch():
+    from onto.database.mock import MockDatabase
+    from onto.database import Snapshot
+    from unittest.mock import patch
+
+    ref = MockDatabase.ref / 'batchCol'
+    with patch.object(MockDatabase, 'set_many') as mock_method:
+        with MockDatabase.batch() as batch:
+            batch.set(ref=ref / 'a', snapshot=Snapshot(foo='a'))
+            batch.set(ref=ref / 'b', snapshot=Snapshot(foo='b'))
+            assert mock_method.call_count == 0
+        assert mock_method.call_count == 1
+        (items, ), _ = mock_method.call_args
+        assert [str(ref) for ref, _ in items] == ['batchCol/a', 'batchCol/b']
+
+
+def test_firestore_set_many_chunks():
+    from onto.database.firestore import FirestoreDatabase
+    from onto.database import Snapshot
+    from unittest.mock import patch, MagicMock
+
+    client = MagicMock()
+    with patch.object(FirestoreDatabase, 'firestore_client', client):
+        ref = FirestoreDatabase.ref / 'chunks'
+        FirestoreDatabase.set_many(
+            (ref / str(i), Snapshot(i=i)) for i in range(1201)
+        )
+    assert client.batch.call_count == 3
+    assert client.batch.return_value.set.call_count == 1201
+    assert client.batch.return_value.commit.call_count == 3
+
+
 def test_watch():
     from onto.watch import _Watch
     from onto.context import Context as CTX
@@ -182,6 +571,37 @@ def test_snapshot_init_meta():
     assert snapshot.my_arg == 1
 
 
+def test_snapshot_view():
+    from onto.database import Snapshot
+    import pytest
+    d = dict(foo='bar')
+    snapshot = Snapshot(d, __onto_meta__=dict(exists=True))
+    assert snapshot.exists is True
+    assert snapshot.update_time is None
+    assert not hasattr(snapshot, '__dict__')
+
+    view = snapshot.view()
+    assert view == {'foo': 'bar'}
+    with pytest.raises(TypeError):
+        view['foo'] = 'baz'
+    with pytest.raises(TypeError):
+        snapshot['foo'] = 'baz'
+
+    copied = snapshot.to_dict()
+    copied['foo'] = 'baz'
+    assert snapshot['foo'] == 'bar'
+    assert Snapshot(foo='bar') == snapshot
+
+
+def test_snapshot_none():
+    from onto.database import Snapshot
+    # DocumentSnapshot.to_dict() returns None for a missing document
+    snapshot = Snapshot(None, __onto_meta__=dict(exists=False))
+    assert snapshot.to_dict() == {}
+    assert len(snapshot) == 0
+    assert snapshot.exists is False
+
+
 # def test_stuffs():
 #
 #     from collections import UserDict
@@ -191,3 +611,169 @@ def test_snapshot_init_meta():
 #             print(item)
 #
 #     ExpD()[1:2]
+
+
+def test_coalesced_source_called_once():
+    import threading
+    from unittest.mock import patch
+    from onto.coordinator import Coordinator
+    from onto.database import Snapshot
+    from onto.database.firestore import FirestoreListener
+    from onto.source.firestore import FirestoreSource
+    from onto.store.snapshot_container import SnapshotContainer
+
+    coordinator = Coordinator(n_workers=1, overflow='coalesce')
+    res = list()
+    source = FirestoreSource(query=None)
+    source._invoke_mediator = \
+        lambda func_name, ref, snapshot: res.append((func_name, snapshot))
+
+    with patch.object(FirestoreListener, '_coordinator', coordinator), \
+            patch.object(FirestoreListener, 'for_query') as for_query:
+        FirestoreListener.register(query=None, source=source)
+        FirestoreListener._registry.pop(for_query.return_value, None)
+        callback = for_query.call_args.kwargs['cb']
+
+        # Holds the worker while the writes arrive
+        gate = threading.Event()
+        coordinator._add_awaitable(gate.wait)
+
+        container = SnapshotContainer(max_versions=1)
+        prev = Snapshot(dict(n=-1), __onto_meta__=dict(exists=True))
+        for i in range(50):
+            cur = Snapshot(
+                dict(n=i), __onto_meta__=dict(exists=True, prev=prev))
+            container.set('hot', cur, (i, 0))
+            container.add_read_time((i, 0))
+            callback(container)
+            prev = cur
+        gate.set()
+        coordinator.join()
+
+    assert [(func_name, snapshot['n']) for func_name, snapshot in res] \
+        == [('on_update', 49)]
+    assert coordinator.n_coalesced == 49
+
+
+class FakeListenCall:
+    """ Stands in for the gRPC call of a Listen stream
+    """
+
+    def __init__(self):
+        self.active = True
+        self.done_callbacks = list()
+
+    def add_done_callback(self, callback):
+        self.done_callbacks.append(callback)
+
+    def is_active(self):
+        return self.active
+
+    def cancel(self):
+        self.active = False
+
+
+def _fake_watch():
+    """ Returns a _Watch on a fake Listen RPC, and the list of calls
+    """
+    from types import SimpleNamespace
+    from onto.watch import _Watch
+
+    calls = list()
+
+    def listen(requests, metadata=None):
+        calls.append(FakeListenCall())
+        return calls[-1]
+
+    firestore = SimpleNamespace(
+        _firestore_api=SimpleNamespace(
+            transport=SimpleNamespace(listen=listen)),
+        _rpc_metadata=(),
+        _database_string='projects/p/databases/(default)',
+    )
+
+    class FakeConsumer:
+
+        def __init__(self, rpc, on_response):
+            self.is_active = False
+
+        def start(self):
+            pass
+
+    watch = _Watch(
+        firestore=firestore,
+        comparator=lambda d1, d2: 1,
+        document_snapshot_cls=None,
+        document_reference_cls=None,
+        BackgroundConsumer=FakeConsumer,
+    )
+    return watch, calls
+
+
+def _sent(watch):
+    requests = list()
+    while not watch._rpc._request_queue.empty():
+        requests.append(watch._rpc._request_queue.get_nowait())
+    return requests
+
+
+def test_watch_ready():
+    watch, calls = _fake_watch()
+    with pytest.raises(TimeoutError):
+        watch.wait_until_ready(timeout=0.01)
+    watch.READY_TIMEOUT = 0.01
+    with pytest.raises(TimeoutError):
+        watch.add_target({'target_id': 32}, callback=None)
+    assert watch.n_targets == 0
+
+    watch._rpc.open()
+    watch.wait_until_ready(timeout=0)
+    assert len(calls) == 1
+
+    watch.close()
+    with pytest.raises(TimeoutError):
+        watch.wait_until_ready(timeout=0)
+
+
+def test_watch_reopen_resumes_targets():
+    from google.api_core import exceptions
+
+    watch, calls = _fake_watch()
+    watch._rpc.open()
+    documents = {'documents': ['projects/p/databases/(default)/documents/c/d']}
+    watch.add_target(
+        {'target_id': 32, 'documents': documents}, callback=None)
+    watch.add_target(
+        {'target_id': 33, 'documents': documents}, callback=None)
+    assert [request.add_target.target_id for request in _sent(watch)] \
+        == [32, 33]
+    watch.resume_token = b'token'
+
+    # A recoverable error re-opens the stream, which re-adds the targets
+    #   to resume after the last push
+    done = list()
+    watch.add_done_callback(done.append)
+    calls[-1].active = False
+    watch._rpc._on_call_done(exceptions.ServiceUnavailable('unavailable'))
+    assert len(calls) == 2
+    requests = _sent(watch)
+    assert [request.add_target.target_id for request in requests] \
+        == [32, 33]
+    assert all(request.add_target.resume_token == b'token'
+               for request in requests)
+    assert done == []
+    watch.wait_until_ready(timeout=0)
+    watch.close()
+
+
+def test_listener_forgets_failed_targets():
+    from onto.database.firestore import FirestoreListener
+
+    handle = object()
+    FirestoreListener._registry[handle] = 'source'
+    FirestoreListener._target_keys[handle] = 'key'
+    _ = FirestoreListener._containers[handle]
+    FirestoreListener._on_watch_error([handle], RuntimeError())
+    assert handle not in FirestoreListener._registry
+    assert handle not in FirestoreListener._target_keys
+    assert handle not in FirestoreListener._containers
@@ -0,0 +1,85 @@
+from unittest.mock import patch
+
+from onto.context import Context as CTX
+from onto.database import Snapshot
+from onto.database.mock import MockDatabase
+from onto.firestore_object import FirestoreObject
+from onto.mapper.helpers import RelationshipReference
+from onto.store.gallery import Gallery
+
+
+class GalleryLocation:
+
+    def __init__(self, ref, d):
+        self.ref = ref
+        self.d = d
+
+    @classmethod
+    def from_snapshot(cls, ref, snapshot, _store=None):
+        return cls(ref=ref, d=snapshot.to_dict())
+
+
+class GalleryOrder(FirestoreObject):
+    pass
+
+
+def _get_many(refs, transaction=None):
+    return [(ref, Snapshot(name=ref.id)) for ref in refs]
+
+
+def test_gallery_batches_relationships():
+    refs = [MockDatabase.ref/'locations'/f'l{i}' for i in range(3)]
+    ds = [
+        {'start_location': RelationshipReference(
+            nested=True, doc_ref=ref, obj_type=GalleryLocation)}
+        for ref in refs + refs
+    ]
+
+    with patch.object(CTX, 'db', MockDatabase), patch.object(
+            MockDatabase, 'get_many', side_effect=_get_many) as get_many:
+        gallery = Gallery()
+        with gallery.activate():
+            assert Gallery.current() is gallery
+            res = [GalleryOrder._import_from_dict(d) for d in ds]
+        assert Gallery.current() is None
+        assert get_many.call_count == 0
+
+        locations = [d['start_location'] for d in res]
+        assert locations[4].d == {'name': 'l1'}
+        assert get_many.call_count == 1
+        assert set(get_many.call_args.kwargs['refs']) == set(refs)
+
+        assert [location.d['name'] for location in locations] == \
+            ['l0', 'l1', 'l2', 'l0', 'l1', 'l2']
+        assert get_many.call_count == 1
+        assert all(d['_store'] is gallery for d in res)
+
+
+def test_gallery_without_activate():
+    ref = MockDatabase.ref/'locations'/'l0'
+    d = {'start_location': RelationshipReference(
+        nested=True, doc_ref=ref, obj_type=GalleryLocation)}
+
+    with patch.object(CTX, 'db', MockDatabase), patch.object(
+            MockDatabase, 'get_many', side_effect=_get_many) as get_many:
+        res = GalleryOrder._import_from_dict(d)
+        assert get_many.call_count == 1
+        assert res['start_location'].d == {'name': 'l0'}
+        assert res['_store'] is not Gallery.current()
+
+
+def test_gallery_with_transaction():
+    ref = MockDatabase.ref/'locations'/'l0'
+    d = {'start_location': RelationshipReference(
+        nested=True, doc_ref=ref, obj_type=GalleryLocation)}
+    transaction = object()
+
+    with patch.object(CTX, 'db', MockDatabase), patch.object(
+            MockDatabase, 'get_many', side_effect=_get_many) as get_many:
+        with Gallery().activate():
+            res = GalleryOrder._import_from_dict(d, transaction=transaction)
+        # Read with the transaction of the import instead of deferred
+        assert get_many.call_count == 1
+        assert get_many.call_args.kwargs['transaction'] is transaction
+        assert res['start_location'].d == {'name': 'l0'}
+        assert get_many.call_count == 1
@@ -0,0 +1,162 @@
+import asyncio
+from unittest.mock import patch
+
+from onto.models.base import BaseRegisteredModel
+
+
+class GraphQLSinkForm(BaseRegisteredModel):
+
+    @classmethod
+    def from_dict_special(cls, d, **kwargs):
+        return cls, d
+
+
+def test_compiled_invokers():
+    from onto.sink.graphql import GraphQLMutationSink, GraphQLSink
+    from onto.view_model import ViewModel
+
+    asyncio.set_event_loop(asyncio.new_event_loop())
+
+    class CompiledMutationMediator:
+        mutate_view = GraphQLMutationSink(view_model_cls=ViewModel)
+
+        @mutate_view.triggers.mutate
+        def mutate(self, form: GraphQLSinkForm, note: str):
+            return form, note
+
+    m = CompiledMutationMediator()
+    CompiledMutationMediator.mutate_view.parent = lambda: lambda: m
+    sink = CompiledMutationMediator.mutate_view
+    sink._compile_invokers()
+
+    with patch.object(GraphQLSink, '_parameters_for') as parameters_for:
+        res = [sink._invoke_mediator(
+            func_name='mutate', form={'a': i}, note='n') for i in range(3)]
+        assert parameters_for.call_count == 0
+
+    assert res[2] == ((GraphQLSinkForm, {'a': 2}), 'n')
+
+    asyncio.get_event_loop().close()
+    asyncio.set_event_loop(None)
+
+
+def _hello_schema():
+    import graphql
+
+    async def resolve_hello(parent, info, name='world'):
+        return f'hello {name}'
+
+    return graphql.GraphQLSchema(
+        query=graphql.GraphQLObjectType('Query', {
+            'hello': graphql.GraphQLField(
+                graphql.GraphQLString,
+                args={'name': graphql.GraphQLArgument(graphql.GraphQLString)},
+                resolve=resolve_hello,
+            )
+        })
+    )
+
+
+def test_document_cache():
+    import graphql
+    from onto.sink.graphql import DocumentCache
+
+    documents = DocumentCache(_hello_schema(), maxsize=2)
+    query = 'query Q($name: String) { hello(name: $name) }'
+
+    async def main():
+        with patch.object(graphql, 'parse', wraps=graphql.parse) as parse:
+            results = [
+                await documents.execute(query, variables={'name': str(i)})
+                for i in range(3)
+            ]
+            assert parse.call_count == 1
+        return results
+
+    results = asyncio.run(main())
+    assert [result.data for result in results] == [
+        {'hello': 'hello 0'}, {'hello': 'hello 1'}, {'hello': 'hello 2'}]
+    assert (documents.n_misses, documents.n_hits) == (1, 2)
+
+    document, errors = documents.get('{ goodbye }')
+    assert document is not None and len(errors) == 1
+    assert documents.get('{ goodbye }')[1] == errors
+    assert len(documents.get('{ hello')[1]) == 1
+
+    # Least recently used is evicted
+    documents.get(query)
+    assert documents.n_misses == 4
+
+
+def test_document_cache_persisted():
+    from onto.sink.graphql import DocumentCache
+
+    documents = DocumentCache(_hello_schema())
+    query = '{ hello }'
+    query_id = DocumentCache.query_id_of(query)
+
+    async def main():
+        unknown = await documents.execute(query_id=query_id)
+        registered = await documents.execute(query=query, query_id=query_id)
+        persisted = await documents.execute(query_id=query_id)
+        mismatched = await documents.execute(query=query, query_id='0')
+        return unknown, registered, persisted, mismatched
+
+    unknown, registered, persisted, mismatched = asyncio.run(main())
+    assert unknown.errors[0].message == 'PersistedQueryNotFound'
+    assert registered.data == persisted.data == {'hello': 'hello world'}
+    assert mismatched.errors[0].message == 'PersistedQueryNotFound'
+    assert documents.persisted == {query_id: query}
+
+
+def test_cached_graphql():
+    import json
+    import graphql
+    from onto.sink.graphql import CachedGraphQL, DocumentCache
+
+    passed = list()
+    contexts = list()
+
+    async def app(scope, receive, send):
+        passed.append(scope['type'])
+
+    def context(scope, receive):
+        contexts.append((scope, receive))
+        return {'request': scope}
+
+    cached = CachedGraphQL(app=app, documents=DocumentCache(_hello_schema()),
+                           context=context)
+
+    async def request(body):
+        messages = [{'type': 'http.request', 'body': body}]
+        sent = list()
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'POST',
+                 'headers': [(b'content-type', b'application/json')]}
+        await cached(scope, receive, send)
+        return sent[0]['status'], json.loads(sent[1]['body'])
+
+    async def main():
+        body = json.dumps({
+            'query': 'query Q($name: String) { hello(name: $name) }',
+            'variables': {'name': 'x'},
+        }).encode()
+        with patch.object(graphql, 'parse', wraps=graphql.parse) as parse:
+            responses = [await request(body) for _ in range(2)]
+            assert parse.call_count == 1
+        responses.append(await request(b'{'))
+        await cached({'type': 'websocket'}, None, None)
+        _, receive = contexts[0]
+        assert (await receive())['body'] == body
+        return responses
+
+    responses = asyncio.run(main())
+    assert responses[0] == responses[1] == (200, {'data': {'hello': 'hello x'}})
+    assert responses[2][0] == 400
+    assert passed == ['websocket']
@@ -0,0 +1,240 @@
+from unittest.mock import patch
+
+import pytest
+
+
+class FakeFuture:
+
+    def __init__(self, topic, key, value):
+        self.topic = topic
+        self.key = key
+        self.value = value
+
+
+class FakeProducer:
+
+    def __init__(self, **config):
+        self.config = config
+        self.sent = list()
+        self.n_flushes = 0
+
+    def send(self, topic, key=None, value=None, **kwargs):
+        future = FakeFuture(topic=topic, key=key, value=value)
+        future.headers = kwargs.get('headers', None)
+        self.sent.append(future)
+        return future
+
+    def flush(self, timeout=None):
+        self.n_flushes += 1
+
+    def close(self, timeout=None):
+        self.closed = True
+
+
+@pytest.fixture
+def kafka_database():
+    from onto.context import Context as CTX
+    from onto.database.kafka import KafkaDatabase
+    bootstrap_servers = KafkaDatabase.bootstrap_servers
+    producer_config = KafkaDatabase.producer_config
+    codec = KafkaDatabase.codec
+    with patch('kafka.KafkaProducer', FakeProducer):
+        db = CTX.create_db(dict(
+            type='kafka',
+            bootstrap_servers='kafka:9092',
+            linger_ms=5,
+            batch_size=65536,
+            compression_type='lz4',
+            acks='all',
+        ))
+        yield db
+    KafkaDatabase.bootstrap_servers = bootstrap_servers
+    KafkaDatabase.producer_config = producer_config
+    KafkaDatabase.codec = codec
+    KafkaDatabase.kafka_producer.cache_clear()
+
+
+def test_kafka_producer_config(kafka_database):
+    producer = kafka_database.kafka_producer()
+    assert producer.config == dict(
+        bootstrap_servers=['kafka:9092'],
+        linger_ms=5,
+        batch_size=65536,
+        compression_type='lz4',
+        acks='all',
+    )
+
+
+def test_kafka_set_many_flush_delete(kafka_database):
+    from onto.database import Snapshot
+    from onto.database.kafka import KafkaReference
+
+    ref_a = KafkaReference.from_str('things/a')
+    ref_b = KafkaReference.from_str('things/b')
+    futures = kafka_database.set_many([
+        (ref_a, Snapshot(n=1)),
+        (ref_b, Snapshot(n=2)),
+    ])
+    kafka_database.flush()
+
+    producer = kafka_database.kafka_producer()
+    assert futures == producer.sent
+    assert [(f.topic, f.key, f.value) for f in futures] == [
+        ('things', b'a', b'{"n": 1}'),
+        ('things', b'b', b'{"n": 2}'),
+    ]
+    assert futures[0].headers == [('onto-codec', b'json')]
+    assert producer.n_flushes == 1
+
+    future = kafka_database.delete(ref_a)
+    assert (future.topic, future.key, future.value) == ('things', b'a', None)
+
+
+def test_kafka_set_codec(kafka_database):
+    from onto.codec import get_codec
+    from onto.database import Snapshot
+    from onto.database.kafka import KafkaReference
+
+    ref = KafkaReference.from_str('things/a')
+    future = kafka_database.set(ref, Snapshot(n=1), codec='msgpack')
+    assert future.headers == [('onto-codec', b'msgpack')]
+    assert get_codec('msgpack').decode(future.value) == {'n': 1}
+
+
+class FakeAsyncProducer:
+
+    instances = list()
+
+    def __init__(self, **config):
+        self.config = config
+        self.sent = list()
+        self.n_starts = 0
+        self.stopped = False
+        self.instances.append(self)
+
+    async def start(self):
+        self.n_starts += 1
+
+    async def send(self, topic, value=None, key=None, headers=None):
+        import asyncio
+        self.sent.append((topic, key, value, headers))
+        future = asyncio.get_event_loop().create_future()
+        future.set_result(len(self.sent))
+        return future
+
+    async def stop(self):
+        self.stopped = True
+
+
+def test_kafka_producer_pool():
+    import asyncio
+    from onto.database.kafka import KafkaProducerPool
+
+    pool = KafkaProducerPool(
+        bootstrap_servers='kafka:9092', batch_size=65536, retries=3)
+
+    async def main():
+        futures = await asyncio.gather(
+            pool.send('t', 'a'),
+            pool.send('t', b'b', key='k'),
+        )
+        assert await pool.send_and_wait('t', 'c') == 3
+        return await asyncio.gather(*futures)
+
+    with patch('aiokafka.AIOKafkaProducer', FakeAsyncProducer):
+        loop = asyncio.new_event_loop()
+        assert loop.run_until_complete(main()) == [1, 2]
+        pool.close()
+        loop.close()
+
+    producer = FakeAsyncProducer.instances[-1]
+    assert producer.n_starts == 1
+    assert producer.config == dict(
+        bootstrap_servers='kafka:9092', linger_ms=5, max_batch_size=65536)
+    assert producer.sent == [
+        ('t', None, b'a', None),
+        ('t', b'k', b'b', None),
+        ('t', None, b'c', None),
+    ]
+    assert producer.stopped
+
+
+def test_kafka_set_async(kafka_database):
+    import asyncio
+    from onto.context import Context as CTX
+    from onto.database import Snapshot
+    from onto.database.kafka import KafkaReference
+
+    ref = KafkaReference.from_str('things/a')
+
+    async def main():
+        future = await kafka_database.set_async(ref, Snapshot(n=1))
+        return await future
+
+    with patch('aiokafka.AIOKafkaProducer', FakeAsyncProducer):
+        assert asyncio.run(main()) == 1
+        # Stopped on its own loop before asyncio.run closes it
+        producer = FakeAsyncProducer.instances[-1]
+        assert producer.stopped
+        CTX.close_kafka_producer_pool()
+
+    assert producer.config['bootstrap_servers'] == 'kafka:9092'
+    assert producer.config['max_batch_size'] == 65536
+    assert producer.sent == [
+        ('things', b'a', b'{"n": 1}', [('onto-codec', b'json')])]
+
+
+def test_kafka_sync_and_async_producers(kafka_database):
+    import asyncio
+    from onto.context import Context as CTX
+    from onto.database import Snapshot
+    from onto.database.kafka import KafkaReference
+
+    ref = KafkaReference.from_str('things/a')
+    CTX.close_kafka_producer_pool()
+    n_instances = len(FakeAsyncProducer.instances)
+
+    async def main():
+        return await kafka_database.set_async(ref, Snapshot(n=2))
+
+    with patch('aiokafka.AIOKafkaProducer', FakeAsyncProducer):
+        # The sync API does not use the pool
+        kafka_database.set(ref, Snapshot(n=1))
+        kafka_database.delete(ref)
+        assert CTX._kafka_producer_pool is None
+        assert len(FakeAsyncProducer.instances) == n_instances
+        # and set_async does not use the sync producer
+        asyncio.run(main())
+        CTX.close_kafka_producer_pool()
+
+    assert [f.value for f in kafka_database.kafka_producer().sent] \
+        == [b'{"n": 1}', None]
+    producer = FakeAsyncProducer.instances[-1]
+    assert [value for _, _, value, _ in producer.sent] == [b'{"n": 2}']
+
+
+def test_kafka_producer_pool_close_from_loop():
+    import asyncio
+    from onto.database.kafka import KafkaProducerPool
+
+    pool = KafkaProducerPool(bootstrap_servers='kafka:9092')
+
+    async def main():
+        await pool.send('t', 'a')
+        with pytest.raises(RuntimeError):
+            pool.close()
+        await pool.stop()
+
+    with patch('aiokafka.AIOKafkaProducer', FakeAsyncProducer):
+        asyncio.run(main())
+    assert FakeAsyncProducer.instances[-1].stopped
+
+
+def test_kafka_reconfigure_closes_producer(kafka_database):
+    from onto.context import Context as CTX
+
+    producer = kafka_database.kafka_producer()
+    with patch('kafka.KafkaProducer', FakeProducer):
+        CTX.create_db(dict(type='kafka', bootstrap_servers='kafka:9092'))
+    assert producer.closed
+    assert kafka_database.kafka_producer() is not producer
@@ -0,0 +1,334 @@
+import asyncio
+from collections import namedtuple
+from unittest.mock import patch
+
+import pytest
+
+TP = namedtuple('TP', ['topic', 'partition'])
+
+
+def _record(topic, partition, offset, v):
+    """ Returns a ConsumerRecord with a msgpack-encoded value {'v': v}
+    """
+    from aiokafka.structs import ConsumerRecord
+    from onto.codec import get_codec
+    value = get_codec('msgpack').encode({'v': v})
+    return ConsumerRecord(
+        topic=topic, partition=partition, offset=offset, timestamp=0,
+        timestamp_type=0, key=None, value=value, checksum=None,
+        serialized_key_size=-1, serialized_value_size=len(value),
+        headers=(('onto-codec', b'msgpack'),))
+
+
+class FakeBroker:
+    """ In-process stand-in for a Kafka broker with one consumer
+    """
+
+    def __init__(self, topic, n_partitions, n_messages):
+        self.topic = topic
+        self.log = {
+            TP(topic, p): [_record(topic, p, offset, f'{p}-{offset}')
+                           for offset in range(n_messages)]
+            for p in range(n_partitions)
+        }
+        self.committed = dict()
+        self.consumers = list()
+        self.revoke_after = None
+        self.committed_on_revoke = None
+
+    def consumer(self, *topics, **config):
+        consumer = FakeConsumer(broker=self, topics=topics, **config)
+        self.consumers.append(consumer)
+        return consumer
+
+
+class FakeConsumer:
+
+    def __init__(self, broker, topics, **config):
+        self.broker = broker
+        self.topics = topics
+        self.config = config
+        self.listener = None
+        self.assignment = set(broker.log)
+        self.positions = {tp: 0 for tp in broker.log}
+        self.n_polls = 0
+        self.n_commits = 0
+        self.paused = set()
+        self.n_pauses = 0
+        self.stopped = False
+
+    def subscribe(self, topics, listener=None):
+        self.topics = topics
+        self.listener = listener
+
+    async def start(self):
+        pass
+
+    async def getmany(self, timeout_ms, max_records):
+        if self.n_polls == self.broker.revoke_after:
+            revoked = {TP(self.broker.topic, 0)}
+            await self.listener.on_partitions_revoked(revoked)
+            self.broker.committed_on_revoke = dict(self.broker.committed)
+            self.assignment -= revoked
+        self.n_polls += 1
+        res = dict()
+        while len(res) == 0:
+            for tp in sorted(self.assignment - self.paused):
+                position = self.positions[tp]
+                messages = \
+                    self.broker.log[tp][position:position + max_records]
+                self.positions[tp] += len(messages)
+                if len(messages) != 0:
+                    res[tp] = messages
+            if len(res) == 0 and len(self.paused) == 0:
+                raise RuntimeError('end of test')
+            await asyncio.sleep(timeout_ms / 1000 if len(res) == 0 else 0)
+        return res
+
+    def pause(self, *tps):
+        self.paused.update(tps)
+        self.n_pauses += 1
+
+    def resume(self, *tps):
+        self.paused.difference_update(tps)
+
+    async def commit(self, offsets=None):
+        self.n_commits += 1
+        if offsets is None:
+            offsets = dict(self.positions)
+        self.broker.committed.update(offsets)
+
+    async def stop(self):
+        self.stopped = True
+
+
+def test_kafka_source_batch():
+    from onto.source.kafka import KafkaSource
+
+    broker = FakeBroker(topic='t', n_partitions=2, n_messages=3)
+    res = list()
+
+    class KafkaBatchMediator:
+        src = KafkaSource(
+            topic_name='t', batch=True, max_records=2, group_id='g',
+            bootstrap_servers='kafka:9092'
+        )
+
+        @src.triggers.on_topic_batch
+        async def on_batch(self, messages):
+            # Values are decoded with the codec named in the headers
+            assert all(message.value.exists for message in messages)
+            res.append([message.value['v'] for message in messages])
+
+    m = KafkaBatchMediator()
+    KafkaBatchMediator.src.parent = lambda: lambda: m
+
+    with patch('aiokafka.AIOKafkaConsumer', broker.consumer):
+        with pytest.raises(ValueError):
+            asyncio.run(KafkaBatchMediator.src._register())
+
+    consumer = broker.consumers[-1]
+    assert res == [['0-0', '0-1', '1-0', '1-1'], ['0-2', '1-2']]
+    # Committed after each batch
+    assert consumer.n_commits == 2
+    assert broker.committed == {TP('t', 0): 3, TP('t', 1): 3}
+    assert consumer.config['group_id'] == 'g'
+    assert consumer.config['enable_auto_commit'] is False
+    assert consumer.config['bootstrap_servers'] == 'kafka:9092'
+    assert consumer.stopped
+
+
+def test_kafka_source_partitioned():
+    from onto.source.kafka import KafkaSource
+
+    broker = FakeBroker(topic='t', n_partitions=2, n_messages=4)
+    res = list()
+
+    class KafkaPartitionedMediator:
+        src = KafkaSource(topic_name='t', max_records=2, group_id='g')
+
+        @src.triggers.on_topic
+        async def on_message(self, message):
+            # Partition 0 waits for partition 1, which would never
+            #   happen if partitions were handled one after another
+            if message.partition == 0 and message.offset == 0:
+                await asyncio.wait_for(self.started.wait(), timeout=1)
+            if message.partition == 1:
+                self.started.set()
+            await asyncio.sleep(0)
+            res.append(message.value['v'])
+
+    m = KafkaPartitionedMediator()
+    KafkaPartitionedMediator.src.parent = lambda: lambda: m
+
+    async def main():
+        m.started = asyncio.Event()
+        await KafkaPartitionedMediator.src._register()
+
+    with patch('aiokafka.AIOKafkaConsumer', broker.consumer):
+        with pytest.raises(ValueError):
+            asyncio.run(main())
+
+    consumer = broker.consumers[-1]
+    assert consumer.config['group_id'] == 'g'
+    assert consumer.topics == ['t']
+
+    assert sorted(res) == sorted(
+        f'{p}-{offset}' for p in range(2) for offset in range(4))
+    assert res.index('1-0') < res.index('0-0')
+    for p in range(2):
+        values = [value for value in res if value.startswith(f'{p}-')]
+        assert values == [f'{p}-{offset}' for offset in range(4)]
+
+    assert broker.committed == {TP('t', 0): 4, TP('t', 1): 4}
+
+
+def test_kafka_source_rebalance_drains():
+    from onto.source.kafka import KafkaSource
+
+    broker = FakeBroker(topic='t', n_partitions=2, n_messages=4)
+    broker.revoke_after = 1
+    res = list()
+
+    class KafkaRebalanceMediator:
+        src = KafkaSource(topic_name='t', max_records=2, group_id='g')
+
+        @src.triggers.on_topic
+        async def on_message(self, message):
+            await asyncio.sleep(0.01)
+            res.append(message.value['v'])
+
+    m = KafkaRebalanceMediator()
+    KafkaRebalanceMediator.src.parent = lambda: lambda: m
+
+    with patch('aiokafka.AIOKafkaConsumer', broker.consumer):
+        with pytest.raises(ValueError):
+            asyncio.run(KafkaRebalanceMediator.src._register())
+
+    # In-flight messages of partition 0 were handled and committed
+    #   before the partition was revoked
+    assert broker.committed_on_revoke[TP('t', 0)] == 2
+    assert '0-1' in res and '0-2' not in res
+    assert broker.committed == {TP('t', 0): 2, TP('t', 1): 4}
+
+
+def test_kafka_source_partitioned_error():
+    from onto.source.kafka import KafkaSource
+
+    broker = FakeBroker(topic='t', n_partitions=1, n_messages=4)
+
+    class KafkaFailingMediator:
+        src = KafkaSource(topic_name='t', max_records=2, group_id='g')
+
+        @src.triggers.on_topic
+        def on_message(self, message):
+            if message.offset == 2:
+                raise RuntimeError('handler failed')
+
+    m = KafkaFailingMediator()
+    KafkaFailingMediator.src.parent = lambda: lambda: m
+
+    with patch('aiokafka.AIOKafkaConsumer', broker.consumer):
+        with pytest.raises(ValueError):
+            asyncio.run(KafkaFailingMediator.src._register())
+
+    # Offsets of the failed batch are not committed
+    assert broker.committed == {TP('t', 0): 2}
+
+
+def test_kafka_source_partitioned_pauses():
+    from onto.source.kafka import KafkaSource
+
+    broker = FakeBroker(topic='t', n_partitions=2, n_messages=8)
+    res = list()
+
+    class KafkaSlowMediator:
+        src = KafkaSource(
+            topic_name='t', max_records=1, group_id='g', max_pending=1,
+            timeout_ms=1)
+
+        @src.triggers.on_topic
+        def on_message(self, message):
+            # Blocking handler; runs in the default executor
+            import time
+            time.sleep(0.002)
+            res.append(message.value['v'])
+
+    m = KafkaSlowMediator()
+    KafkaSlowMediator.src.parent = lambda: lambda: m
+
+    with patch('aiokafka.AIOKafkaConsumer', broker.consumer):
+        with pytest.raises(ValueError):
+            asyncio.run(KafkaSlowMediator.src._register())
+
+    consumer = broker.consumers[-1]
+    # Partitions are paused instead of queueing every polled batch
+    assert consumer.n_pauses != 0
+    assert consumer.paused == set()
+    for p in range(2):
+        values = [value for value in res if value.startswith(f'{p}-')]
+        assert values == [f'{p}-{offset}' for offset in range(8)]
+    assert broker.committed == {TP('t', 0): 8, TP('t', 1): 8}
+
+
+class FakeStreamConsumer:
+    """ Consumer for `async for`, which ends with an error after records
+    """
+
+    def __init__(self, records, *topics, **config):
+        self.records = list(records)
+        self.config = config
+
+    async def start(self):
+        pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if len(self.records) == 0:
+            raise RuntimeError('end of test')
+        return self.records.pop(0)
+
+    async def stop(self):
+        pass
+
+
+def test_kafka_source_raw_records():
+    import dataclasses
+    from functools import partial
+    from onto.source.kafka import KafkaSource
+
+    encoded = _record('t', 0, 0, 'a')
+    raw = dataclasses.replace(
+        encoded, offset=1, value=b'hello world!', headers=())
+    poison = dataclasses.replace(encoded, offset=2, value=b'\xc1')
+    records = [encoded, raw, poison, dataclasses.replace(raw, offset=3)]
+
+    def consume(**source_kwargs):
+        res = list()
+
+        class KafkaRawMediator:
+            src = KafkaSource(topic_name='t', **source_kwargs)
+
+            @src.triggers.on_topic
+            def on_message(self, message):
+                res.append(message.value)
+
+        m = KafkaRawMediator()
+        KafkaRawMediator.src.parent = lambda: lambda: m
+        with patch('aiokafka.AIOKafkaConsumer',
+                   partial(FakeStreamConsumer, records)):
+            with pytest.raises(ValueError):
+                asyncio.run(KafkaRawMediator.src._register())
+        return res
+
+    # Records without the codec header are passed as consumed, and an
+    #   undecodable record is skipped without stopping the consumer
+    res = consume()
+    assert res[0] == {'v': 'a'}
+    assert res[1:] == [b'hello world!', b'hello world!']
+
+    # The deserializer of the consumer decodes instead
+    res = consume(value_deserializer=bytes)
+    assert res == [record.value for record in records]
@@ -0,0 +1,142 @@
+import pytest
+
+from onto.database import Snapshot
+from onto.database.mock import MockDatabase, MockIndex
+from onto.domain_model import DomainModel
+from onto.mapper import schema, fields
+
+
+class MockLaneSchema(schema.Schema):
+    length = fields.Raw()
+    tags = fields.Raw()
+
+
+class MockLane(DomainModel):
+
+    class Meta:
+        collection_name = 'mockLanes'
+        schema_cls = MockLaneSchema
+
+    @classmethod
+    def _datastore(cls):
+        return MockDatabase
+
+
+class MockShortLane(MockLane):
+    pass
+
+
+@pytest.fixture(scope='module')
+def lanes():
+    for i in range(10):
+        MockLane.new(
+            doc_id=f'l{i}', length=i, tags=['odd'] if i % 2 else ['even']
+        ).save()
+    MockShortLane.new(doc_id='s', length=1, tags=[]).save()
+
+
+def test_where_eq(lanes):
+    assert [o.doc_id for o in MockLane.where('length', '==', 1)] \
+           == ['l1', 's']
+
+
+def test_where_range(lanes):
+    assert [o.doc_id for o in MockLane.where('length', '>=', 8)] \
+           == ['l8', 'l9']
+    assert [o.doc_id for o in MockLane.where('length', '<', 1)] == ['l0']
+    assert [o.doc_id for o in MockLane.where(
+        'length', '>', 2, 'length', '<=', 4)] == ['l3', 'l4']
+
+
+def test_where_in_and_array_contains(lanes):
+    assert [o.doc_id for o in MockLane.where('length', 'in', [2, 3])] \
+           == ['l2', 'l3']
+    assert [o.doc_id for o in MockLane.where(
+        'tags', 'array_contains', 'odd', 'length', '<', 4)] == ['l1', 'l3']
+
+
+def test_all_subclass(lanes):
+    assert [o.doc_id for o in MockShortLane.all()] == ['s']
+
+
+def test_get_many(lanes):
+    refs = [MockLane.ref_from_id('l1'), MockLane.ref_from_id('l2')]
+    res = list(MockDatabase.get_many(refs=refs))
+    assert [(str(ref), snapshot['length']) for ref, snapshot in res] \
+           == [('mockLanes/l1', 1), ('mockLanes/l2', 2)]
+
+
+def test_index_update_and_delete():
+    ref = MockDatabase.ref / 'mockIndexCol'
+    MockDatabase.set(ref=ref / 'a', snapshot=Snapshot(n=1))
+    col = MockDatabase._collections['mockIndexCol']
+    assert col.select([('n', '==', 1)]) == ['mockIndexCol/a']
+
+    MockDatabase.set(ref=ref / 'a', snapshot=Snapshot(n=2))
+    assert col.select([('n', '==', 1)]) == []
+    assert col.select([('n', '>', 1)]) == ['mockIndexCol/a']
+
+    MockDatabase.delete(ref=ref / 'a')
+    assert col.select([('n', '>', 1)]) == []
+
+
+def test_read_does_not_create_collections():
+    assert MockDatabase._collections_of(MockDatabase.ref / 'mockNoCol') == []
+    assert 'mockNoCol' not in MockDatabase._collections
+
+    index = MockIndex()
+    index.add('a', 1)
+    assert index.gt('') == set()
+    assert len(index.ordered) == 1
+
+
+def test_get_missing():
+    ref = MockDatabase.ref / 'mockGetCol'
+    MockDatabase.set(ref=ref / 'a', snapshot=Snapshot(n=1))
+    assert MockDatabase.get(ref=ref / 'a').exists
+    snapshot = MockDatabase.get(ref=ref / 'missing')
+    assert snapshot.exists is False
+    assert snapshot.to_dict() == {}
+    assert [snapshot.exists for _, snapshot in MockDatabase.get_many(
+        refs=[ref / 'a', ref / 'missing'])] == [True, False]
+
+
+def test_index_bool_is_not_number():
+    index = MockIndex()
+    index.add('t', True)
+    index.add('one', 1)
+    index.add('float', 1.0)
+    index.add('zero', 0)
+    index.add('f', False)
+    index.add('tags', [True, 1])
+    assert index.eq(1) == {'one', 'float'}
+    assert index.eq(True) == {'t'}
+    assert index.eq(False) == {'f'}
+    assert index._in([0]) == {'zero'}
+    assert index.contains(1) == {'tags'}
+    index.remove('tags', [True, 1])
+    assert index.contains(True) == set()
+    assert len(index.elements) == 0
+
+
+def test_index_kinds():
+    index = MockIndex()
+    index.add('a', 1)
+    index.add('b', 'x')
+    index.add('c', {'k': 'v'})
+    assert index.gt(0) == {'a'}
+    assert index.ge('') == {'b'}
+    assert index.eq({'k': 'v'}) == {'c'}
+
+
+def test_query_translator_cached(lanes):
+    translator = MockLane._query_translator()
+    assert MockLane._query_translator() is translator
+    assert translator.data_keys['length'] == 'length'
+
+    class MockLongLane(MockLane):
+        pass
+
+    assert MockLane._query_translator() is not translator
+    assert 'MockLongLane' in MockLane._query_translator()\
+        .obj_type_condition.val
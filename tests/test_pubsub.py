@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from onto.sink.pubsub import PubSubHub
+
+
+def test_hub_fan_out():
+    hub = PubSubHub()
+
+    async def main():
+        subs = [hub.subscribe('t') for _ in range(3)]
+        event = {'a': 1}
+        assert hub.publish('t', event) == 3
+        assert hub.publish('other', event) == 0
+        res = [await sub.get() for sub in subs]
+        assert all(r is event for r in res)
+
+        subs[0].close()
+        assert hub.n_subscribers('t') == 2
+        for sub in subs[1:]:
+            sub.close()
+        assert hub.n_subscribers('t') == 0
+
+    asyncio.run(main())
+
+
+def test_hub_waits_and_closes():
+    hub = PubSubHub()
+
+    async def main():
+        sub = hub.subscribe('t')
+        res = list()
+
+        async def consume():
+            async for event in sub:
+                res.append(event)
+
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0)
+        hub.publish('t', 1)
+        await asyncio.sleep(0)
+        hub.publish('t', 2)
+        await asyncio.sleep(0)
+        sub.close()
+        await asyncio.wait_for(task, timeout=1)
+        return res
+
+    assert asyncio.run(main()) == [1, 2]
+
+
+def test_hub_drop_oldest():
+    hub = PubSubHub(maxsize=2, overflow=PubSubHub.DROP_OLDEST)
+
+    async def main():
+        slow = hub.subscribe('t')
+        fast = hub.subscribe('t', maxsize=0)
+        for i in range(5):
+            hub.publish('t', i, key='k')
+        assert slow.n_dropped == 3
+        assert [await slow.get() for _ in range(len(slow))] == [3, 4]
+        assert [await fast.get() for _ in range(len(fast))] == \
+            [0, 1, 2, 3, 4]
+
+    asyncio.run(main())
+
+
+def test_hub_coalesce():
+    hub = PubSubHub(maxsize=2, overflow=PubSubHub.COALESCE)
+
+    async def main():
+        sub = hub.subscribe('t')
+        hub.publish('t', 'a1', key='a')
+        hub.publish('t', 'b1', key='b')
+        hub.publish('t', 'a2', key='a')
+        hub.publish('t', 'a3', key='a')
+        assert sub.n_coalesced == 2
+        assert [await sub.get() for _ in range(len(sub))] == ['a3', 'b1']
+
+        hub.publish('t', 'c1', key='c')
+        hub.publish('t', 'd1', key='d')
+        hub.publish('t', 'e1', key='e')
+        assert sub.n_dropped == 1
+        assert [await sub.get() for _ in range(len(sub))] == ['d1', 'e1']
+
+    asyncio.run(main())
+
+
+def test_hub_unknown_overflow():
+    with pytest.raises(ValueError):
+        PubSubHub(overflow='block')
+
+
+def test_subscription_sink_publish():
+    from onto.sink.graphql import GraphQLSubscriptionSink
+    from onto.view_model import ViewModel
+
+    n_converted = list()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    class PubSubMediator:
+        subscribe_view = GraphQLSubscriptionSink(view_model_cls=ViewModel)
+
+        @subscribe_view.triggers.on_event
+        def on_event(self, event: dict):
+            n_converted.append(event)
+            return dict(event, converted=True)
+
+    m = PubSubMediator()
+    PubSubMediator.subscribe_view.parent = lambda: lambda: m
+    sink = PubSubMediator.subscribe_view
+
+    async def main():
+        # No conversion without subscribers
+        assert sink.publish('user_a', {'n': 0}) == 0
+        subs = [sink.hub.subscribe('user_a') for _ in range(2)]
+        assert sink.publish('user_a', {'n': 1}) == 2
+        return [await sub.get() for sub in subs]
+
+    res = loop.run_until_complete(main())
+    loop.close()
+    asyncio.set_event_loop(None)
+    assert res[0] is res[1]
+    assert res[0] == {'subscribeView': {'n': 1, 'converted': True}}
+    assert n_converted == [{'n': 1}]
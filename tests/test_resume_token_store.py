@@ -0,0 +1,26 @@
+from onto.store import ResumeTokenStore, SqliteResumeTokenStore, \
+    SnapshotContainer
+
+
+def test_sqlite_resume_token_store(tmp_path):
+    path = str(tmp_path / 'resume_tokens.db')
+    store = SqliteResumeTokenStore(path=path)
+    assert store.get('k') is None
+    store.set('k', b'token', (1, 2))
+    # Reopened, as after a restart
+    store = SqliteResumeTokenStore(path=path)
+    assert store.get('k') == (b'token', (1, 2))
+    store.delete('k')
+    assert store.get('k') is None
+
+
+def test_checkpoint_after_consumed():
+    import functools
+    store = ResumeTokenStore()
+    container = SnapshotContainer()
+    container.checkpoint = functools.partial(store.set, 'k')
+    container.set('a', 'v1', (1, 0))
+    container.add_read_time((1, 0), resume_token=b'token')
+    assert store.get('k') is None
+    container.compact()
+    assert store.get('k') == (b'token', (1, 0))
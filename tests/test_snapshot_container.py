@@ -1,3 +1,5 @@
+from math import inf
+
 from onto.store import SnapshotContainer
 
 
@@ -35,3 +37,155 @@ def test_get_with_range():
         key='k',
         hi_incl=(2, 0)
     )) == ['v1', 'v2']
+
+
+def test_compact_max_versions():
+    container = SnapshotContainer(max_versions=1)
+    container.set('k', 'v1', (1, 0))
+    container.set('k', 'v2', (2, 0))
+    container.set('k', 'v3', (3, 0))
+    container.add_read_time((2, 0))
+    container.compact()
+    # v3 is retained since it is not consumed by a read window yet
+    assert list(container.get_with_range(key='k')) == ['v3']
+    assert container.size == 1
+
+    container.set('k', 'v4', (4, 0))
+    container.add_read_time((4, 0))
+    container.compact()
+    assert list(container.get_with_range(key='k')) == ['v4']
+    assert container.read_window() == ((4, 0), (4, 0))
+
+
+def test_compact_max_age():
+    from onto.database import Snapshot
+    container = SnapshotContainer(max_age=10)
+    container.set('a', Snapshot(__onto_meta__=dict(exists=True)), (1, 0))
+    container.set('b', Snapshot(__onto_meta__=dict(exists=False)), (1, 0))
+    latest = Snapshot(__onto_meta__=dict(exists=True))
+    latest.prev = container.previous('a')
+    container.set('a', latest, (5, 0))
+    container.add_read_time((20, 0))
+    container.compact()
+    assert container.size == 1
+    assert not container.has_previous('b')
+    assert container.previous('a') is latest
+    assert latest.prev.prev is None
+
+
+def test_changed_keys():
+    container = SnapshotContainer()
+    container.set('a', 'v1', (1, 0))
+    container.set('b', 'v1', (1, 0))
+    container.add_read_time((1, 0))
+    assert list(container.changed_keys()) == ['a', 'b']
+    container.compact()
+    container.set('b', 'v2', (2, 0))
+    container.add_read_time((2, 0))
+    assert list(container.changed_keys()) == ['b']
+
+
+def test_read_window_accumulates():
+    container = SnapshotContainer()
+    container.set('a', 'v1', (1, 0))
+    container.add_read_time((1, 0))
+    container.set('b', 'v1', (2, 0))
+    container.add_read_time((2, 0))
+    # Not consumed yet: the window spans both read times
+    assert list(container.changed_keys()) == ['a', 'b']
+    assert container.read_window() == ((-inf, -inf), (2, 0))
+
+
+def test_delta_latest_only():
+    from onto.database import Snapshot
+    from onto.source.firestore import FirestoreSource
+
+    container = SnapshotContainer(max_versions=1)
+    prev = Snapshot(__onto_meta__=dict(exists=False))
+    container.set('k', prev, (-inf, -inf))
+    for i in range(3):
+        cur = Snapshot(dict(i=i), __onto_meta__=dict(exists=True, prev=prev))
+        container.set('k', cur, (i, 0))
+        container.add_read_time((i, 0))
+        prev = cur
+
+    assert [(func_name, snapshot['i']) for func_name, _, snapshot
+            in FirestoreSource.delta(container, latest_only=True)] \
+        == [('on_create', 2)]
+    assert container.size == 1
+
+
+def test_compact_forgets_deletions():
+    from onto.database import Snapshot
+    container = SnapshotContainer(max_versions=1)
+    for i in range(1000):
+        key = f'k{i}'
+        container.set(key, Snapshot(__onto_meta__=dict(exists=True)), (i, 0))
+        container.add_read_time((i, 0))
+        container.compact()
+        container.set(key, Snapshot(__onto_meta__=dict(exists=False)), (i, 1))
+        container.add_read_time((i, 1))
+        container.compact()
+    assert container.size == 0
+    assert len(container.d) == 0
+    assert len(container._deleted) == 0
+
+
+def test_compact_visits_changed_keys():
+    from onto.database import Snapshot
+    container = SnapshotContainer(max_age=10)
+    container.set('a', Snapshot(__onto_meta__=dict(exists=False)), (1, 0))
+    for i in range(100):
+        container.set(f'k{i}', Snapshot(__onto_meta__=dict(exists=True)), (1, 0))
+    container.add_read_time((1, 0))
+    container.compact()
+    # The deletion of 'a' is retained by max_age and checked again
+    assert list(container._expiring) == ['a']
+
+    from collections import defaultdict
+    visited = list()
+
+    class D(defaultdict):
+        def get(self, key, default=None):
+            visited.append(key)
+            return super().get(key, default)
+
+    container.d = D(list, container.d)
+    container.set('b', Snapshot(__onto_meta__=dict(exists=True)), (20, 0))
+    container.add_read_time((20, 0))
+    container.compact()
+    assert visited == ['b', 'a']
+    assert not container.has_previous('a')
+    assert len(container._expiring) == 0
+    assert len(container._deleted) == 0
+
+
+def test_view_model_source_call_takes_lock():
+    from onto.database import Snapshot
+    from onto.source.view_model import ViewModelSource
+
+    container = SnapshotContainer(max_versions=1)
+    prev = Snapshot(__onto_meta__=dict(exists=False))
+    for i in range(2):
+        cur = Snapshot(dict(i=i), __onto_meta__=dict(exists=True, prev=prev))
+        container.set('k', cur, (i, 0))
+        container.add_read_time((i, 0))
+        prev = cur
+
+    res = list()
+
+    class FakeViewModel:
+        @staticmethod
+        def from_snapshot(ref, snapshot):
+            # The container is locked while the window is consumed
+            assert not container.lock.acquire(blocking=False)
+            return snapshot['i']
+
+    source = ViewModelSource.__new__(ViewModelSource)
+    source.view_model_cls = FakeViewModel
+    source.latest_only = True
+    source._invoke_mediator = \
+        lambda func_name, obj: res.append((func_name, obj))
+    source._call(container)
+    assert res == [('on_create', 1)]
+    assert container.size == 1